@@ -0,0 +1,197 @@
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+import numpy as np
+
+from mesh_binary import read_mesh_binary, write_mesh_binary
+from mesh_data import MeshData, Material, Point, calc_bounds, calc_cached_indices
+from mesh_text import read_mesh_text, write_materials, write_mesh_text, write_points, write_triangles, write_vertices
+
+#Benchmarks for the bpy-free stages on synthetic meshes, run with plain Python:
+#
+#   python -m mesh_benchmark [--sizes 1000 100000] [--output results.json]
+#   python -m mesh_benchmark --compare baseline.json
+#
+#Each stage is timed over --repeat runs (the fastest is reported) and run once
+#more under tracemalloc for its peak memory. Comparing against an earlier
+#results file exits with 1 if any stage got slower than --threshold times.
+
+DEFAULT_SIZES = (1000, 100000, 1000000)
+
+def make_synthetic_mesh(num_vertices, seed=0):
+    """
+    Returns a wavy grid MeshData with roughly num_vertices vertices
+
+    Every vertex attribute is filled with varied values so the text has
+    realistic number lengths, two materials alternate by row and a few points
+    are added.
+    """
+    side = max(2, int(round(num_vertices ** 0.5)))
+    rng = np.random.default_rng(seed)
+
+    x, z = np.meshgrid(np.linspace(-100, 100, side), np.linspace(-100, 100, side))
+    y = 5 * np.sin(x / 7) * np.cos(z / 11)
+    positions = np.stack([x.ravel(), y.ravel(), z.ravel()], axis=1)
+
+    normals = rng.normal(size=(side * side, 3))
+    normals /= np.linalg.norm(normals, axis=1)[:, None]
+    tangents = np.cross(normals, (0, 0, 1))
+    uv = np.stack([(x.ravel() + 100) / 200, (z.ravel() + 100) / 200], axis=1)
+
+    #Two triangles per grid cell
+    index = np.arange(side * side).reshape(side, side)
+    a = index[:-1, :-1].ravel()
+    b = index[:-1, 1:].ravel()
+    c = index[1:, :-1].ravel()
+    d = index[1:, 1:].ravel()
+    triangles = np.concatenate([np.stack([a, c, b], axis=1), np.stack([b, c, d], axis=1)])
+    material_ids = (triangles[:, 0] // side) % 2
+
+    materials = [Material(diffuse_texture="ship-cl.dds", normal_texture="ship-nm.dds"),
+                    Material(diffuse_texture="hull-cl.dds", team_color_texture="hull-da.dds")]
+    identity = ((1.0, 0.0, 0.0), (0.0, 1.0, 0.0), (0.0, 0.0, 1.0))
+    points = [Point("Weapon-{}".format(i), tuple(positions[i * side].tolist()), identity) for i in range(8)]
+
+    mesh = MeshData(positions=positions,
+                    normals=normals,
+                    tangents=tangents,
+                    colors=rng.integers(0, 1 << 32, side * side, dtype=np.uint32),
+                    uv0=uv,
+                    uv1=uv,
+                    triangles=triangles,
+                    material_ids=material_ids,
+                    materials=materials,
+                    points=points)
+    calc_bounds(mesh)
+    calc_cached_indices(mesh)
+    return mesh
+
+def measure(function, repeat):
+    """
+    Returns (fastest seconds, peak traced bytes) for calling function
+    """
+    seconds = []
+    for i in range(repeat):
+        start = time.perf_counter()
+        function()
+        seconds.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    try:
+        function()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    return min(seconds), peak
+
+def get_stages(mesh, directory):
+    """
+    Returns (name, function) pairs for every benchmarked stage of mesh
+    """
+    text_path = os.path.join(directory, "bench_text.mesh")
+    binary_path = os.path.join(directory, "bench_binary.meshbin")
+    write_mesh_text(text_path, mesh)
+    write_mesh_binary(binary_path, mesh)
+
+    #Per vertex tuples like a naive reader would collect
+    rows = (mesh.positions.tolist(), mesh.normals.tolist(), mesh.uv0.tolist(), mesh.triangles.tolist())
+
+    def round_trip_text():
+        write_mesh_text(text_path, mesh)
+        read_mesh_text(text_path)
+
+    def round_trip_binary():
+        write_mesh_binary(binary_path, mesh)
+        read_mesh_binary(binary_path).positions.sum()
+
+    return [
+        ("parse_text", lambda: read_mesh_text(text_path)),
+        ("to_arrays", lambda: MeshData(positions=rows[0], normals=rows[1], uv0=rows[2], triangles=rows[3])),
+        ("write_materials", lambda: write_materials(mesh.materials)),
+        ("write_points", lambda: write_points(mesh.points)),
+        ("write_vertices", lambda: write_vertices(mesh.positions, mesh.normals, mesh.tangents,
+                                                    mesh.colors, mesh.uv0, mesh.uv1)),
+        ("write_triangles", lambda: write_triangles(mesh.triangles, mesh.material_ids)),
+        ("round_trip_text", round_trip_text),
+        ("round_trip_binary", round_trip_binary),
+    ]
+
+def run_benchmarks(sizes=DEFAULT_SIZES, repeat=3, log=None):
+    """
+    Runs every stage for every size and returns the results as a JSON ready dict
+    """
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        for size in sizes:
+            mesh = make_synthetic_mesh(size)
+            for stage, function in get_stages(mesh, directory):
+                seconds, peak = measure(function, repeat)
+                result = {
+                    "size": size,
+                    "vertices": mesh.num_vertices,
+                    "triangles": mesh.num_triangles,
+                    "stage": stage,
+                    "seconds": seconds,
+                    "peak_bytes": peak,
+                }
+                results.append(result)
+                if log:
+                    log(result)
+
+    return {
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "repeat": repeat,
+        "results": results,
+    }
+
+def compare_results(baseline, current, threshold):
+    """
+    Returns (stage, size, ratio) for each stage slower than threshold times its baseline
+    """
+    previous = {(entry["stage"], entry["size"]): entry["seconds"] for entry in baseline["results"]}
+    regressions = []
+    for entry in current["results"]:
+        before = previous.get((entry["stage"], entry["size"]))
+        if before and entry["seconds"] / before > threshold:
+            regressions.append((entry["stage"], entry["size"], entry["seconds"] / before))
+    return regressions
+
+def print_result(result):
+    print("{size:>9} {stage:<18} {seconds:10.4f} s {peak:10.1f} MB".format(
+        peak=result["peak_bytes"] / (1024 * 1024), **result))
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="mesh_benchmark", description="Benchmark .mesh parsing and writing on synthetic meshes")
+    parser.add_argument("--sizes", type=int, nargs="+", default=list(DEFAULT_SIZES), help="vertex counts to generate")
+    parser.add_argument("--repeat", type=int, default=3, help="timed runs per stage, the fastest is kept")
+    parser.add_argument("--output", help="write the results to this JSON file")
+    parser.add_argument("--compare", help="earlier results JSON to check for regressions")
+    parser.add_argument("--threshold", type=float, default=1.25, help="slowdown ratio counted as a regression")
+    args = parser.parse_args(argv)
+
+    report = run_benchmarks(args.sizes, args.repeat, print_result)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare_results(baseline, report, args.threshold)
+        for stage, size, ratio in regressions:
+            print("{} at {} vertices is {:.2f}x slower".format(stage, size, ratio))
+        if regressions:
+            return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
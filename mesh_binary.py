@@ -0,0 +1,249 @@
+import mmap
+import struct
+import numpy as np
+
+from mesh_data import CACHED_DIRECTIONS, MeshData, Material, Point
+
+#The add-on's own binary mesh format, no bpy required
+#
+#This is NOT the game's binary .mesh layout and the game cannot load it. It is
+#a compact, lossless form of MeshData for fast loading outside the game, kept
+#in files with their own extension (.meshbin) and magic bytes. Reading the
+#game's binary .mesh files is not implemented, mesh_io.detect_format rejects them.
+#
+#The layout follows the text sections in order, all values little endian:
+#
+#   b"MESHBIN1"
+#   int32 maxDiffuseMipLevel, uint32 hasValidTangents, float64 BoundingRadius,
+#   float64[3] MaxBoundingExtents, float64[3] MinBoundingExtents
+#   uint32 NumMaterials, then per material five texture strings,
+#       uint32 Diffuse, Ambient, Specular, Emissive colors and float64 Glossiness
+#   uint32 NumPoints, then per point a name string, float64[3] Position and
+#       float64[3][3] Orientation
+#   uint32 NumVertices, then whole columns: float32[n][3] Position,
+#       float32[n][3] Normal, float32[n][3] Tangent, uint32[n] Color,
+#       float32[n][2] UV0, float32[n][2] UV1
+#   uint32 NumTriangles, then int32[n][3] vertex indices and int32[n] materials
+#   for each of UP, DOWN, LEFT, RIGHT, FRONT, BACK a uint32
+#       NumCachedVertexIndicesInDirection followed by int32[n] vertex indices
+#
+#Header, material and point values are float64 so converting a text file and
+#back keeps them exactly. Strings are a uint32 byte length followed by UTF-8
+#bytes padded to 4 bytes, so every column starts 4 byte aligned and can be
+#viewed in place.
+
+MAGIC = b"MESHBIN1"
+EXTENSION = ".meshbin"
+
+header_struct = struct.Struct("<iId3d3d")
+count_struct = struct.Struct("<I")
+colors_struct = struct.Struct("<4Id")
+point_struct = struct.Struct("<3d9d")
+
+#Bytes per vertex over all the vertex columns
+VERTEX_SIZE = 4 * (3 + 3 + 3 + 1 + 2 + 2)
+
+def padded_length(length):
+    return (length + 3) & ~3
+
+def pack_string(value):
+    data = (value or "").encode("utf-8")
+    return count_struct.pack(len(data)) + data.ljust(padded_length(len(data)), b"\0")
+
+def pack_material(material):
+    output = b"".join(pack_string(texture) for texture in material[:5])
+    output += colors_struct.pack(int(material.diffuse, 16),
+                                    int(material.ambient, 16),
+                                    int(material.specular, 16),
+                                    int(material.emissive, 16),
+                                    float(material.glossiness))
+    return output
+
+def pack_point(point):
+    orientation = [value for row in point.orientation for value in row]
+    return pack_string(point.name) + point_struct.pack(*point.position, *orientation)
+
+class BinaryReader:
+    """
+    Sequential reader over a buffer that hands out NumPy views instead of copies
+    """
+
+    def __init__(self, buffer, offset=0):
+        self.buffer = buffer
+        self.offset = offset
+
+    def unpack(self, layout):
+        values = layout.unpack_from(self.buffer, self.offset)
+        self.offset += layout.size
+        return values
+
+    def count(self):
+        return self.unpack(count_struct)[0]
+
+    def string(self):
+        length = self.count()
+        value = bytes(self.buffer[self.offset:self.offset + length]).decode("utf-8")
+        self.offset += padded_length(length)
+        return value
+
+    def array(self, dtype, count, width=None):
+        dtype = np.dtype(dtype)
+        if width is not None:
+            count *= width
+        values = np.frombuffer(self.buffer, dtype=dtype, count=count, offset=self.offset)
+        self.offset += dtype.itemsize * count
+        if width is not None:
+            values = values.reshape(-1, width)
+        return values
+
+def read_leading_sections(buffer):
+    """
+    Reads the header, materials and points from a buffer holding a .meshbin file
+
+    Returns (reader positioned at NumVertices, header values, materials, points)
+    """
+    if bytes(buffer[:len(MAGIC)]) != MAGIC:
+        raise ValueError("Not a .meshbin file")
+
+    reader = BinaryReader(buffer, len(MAGIC))
+    header = reader.unpack(header_struct)
+
+    materials = []
+    for i in range(reader.count()):
+        textures = [reader.string() for texture in range(5)]
+        diffuse, ambient, specular, emissive, gloss = reader.unpack(colors_struct)
+        materials.append(Material(*textures,
+                                    "{:08x}".format(diffuse),
+                                    "{:08x}".format(ambient),
+                                    "{:08x}".format(specular),
+                                    "{:08x}".format(emissive),
+                                    gloss))
+
+    points = []
+    for i in range(reader.count()):
+        name = reader.string()
+        values = reader.unpack(point_struct)
+        points.append(Point(name, values[0:3], (values[3:6], values[6:9], values[9:12])))
+
+    return reader, header, materials, points
+
+def apply_header(mesh, header):
+    mesh.max_diffuse_mip_level = header[0]
+    mesh.has_valid_tangents = bool(header[1])
+    mesh.bounding_radius = header[2]
+    mesh.max_extents = header[3:6]
+    mesh.min_extents = header[6:9]
+    return mesh
+
+def read_mesh_buffer(buffer):
+    """
+    Builds MeshData from a buffer holding a .meshbin file
+
+    Vertex and triangle arrays are views into the buffer, nothing is copied.
+    """
+    reader, header, materials, points = read_leading_sections(buffer)
+
+    number_verts = reader.count()
+    positions = reader.array("<f4", number_verts, 3)
+    normals = reader.array("<f4", number_verts, 3)
+    tangents = reader.array("<f4", number_verts, 3)
+    colors = reader.array("<u4", number_verts)
+    uv0 = reader.array("<f4", number_verts, 2)
+    uv1 = reader.array("<f4", number_verts, 2)
+
+    number_tris = reader.count()
+    triangles = reader.array("<i4", number_tris, 3)
+    material_ids = reader.array("<i4", number_tris)
+
+    cached_indices = {}
+    for direction in CACHED_DIRECTIONS:
+        cached_indices[direction] = reader.array("<i4", reader.count())
+
+    mesh = MeshData(positions=positions,
+                    normals=normals,
+                    tangents=tangents,
+                    colors=colors,
+                    uv0=uv0,
+                    uv1=uv1,
+                    triangles=triangles,
+                    material_ids=material_ids,
+                    materials=materials,
+                    points=points,
+                    cached_indices=cached_indices)
+
+    return apply_header(mesh, header)
+
+def read_mesh_binary(filepath):
+    """
+    Reads a .meshbin file into MeshData through a read-only memory map
+
+    The vertex and triangle arrays are read-only views of the mapped file, the
+    pages are only loaded as the arrays are used.
+    """
+    with open(filepath, 'rb') as f:
+        buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    return read_mesh_buffer(buffer)
+
+def scan_mesh_binary(filepath):
+    """
+    Reads only the header, materials and points of a .meshbin file
+
+    Returns MeshData without vertices or triangles, their counts are in
+    declared_counts. The vertex columns are skipped using the vertex count.
+    """
+    with open(filepath, 'rb') as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+            reader, header, materials, points = read_leading_sections(buffer)
+            number_verts = reader.count()
+            reader.offset += number_verts * VERTEX_SIZE
+            number_tris = reader.count()
+
+    mesh = apply_header(MeshData(materials=materials, points=points), header)
+    mesh.declared_counts = {
+        "NumMaterials": len(materials),
+        "NumPoints": len(points),
+        "NumVertices": number_verts,
+        "NumTriangles": number_tris,
+    }
+    return mesh
+
+def write_array(f, values, dtype):
+    f.write(np.ascontiguousarray(values, dtype=dtype).data)
+
+def write_mesh_binary(filepath, mesh):
+    """
+    Writes MeshData to a .meshbin file straight from its arrays
+    """
+    with open(filepath, 'wb') as f:
+        f.write(MAGIC)
+        f.write(header_struct.pack(mesh.max_diffuse_mip_level,
+                                    int(mesh.has_valid_tangents),
+                                    mesh.bounding_radius,
+                                    *mesh.max_extents,
+                                    *mesh.min_extents))
+
+        f.write(count_struct.pack(len(mesh.materials)))
+        for material in mesh.materials:
+            f.write(pack_material(material))
+
+        f.write(count_struct.pack(len(mesh.points)))
+        for point in mesh.points:
+            f.write(pack_point(point))
+
+        f.write(count_struct.pack(mesh.num_vertices))
+        write_array(f, mesh.positions, "<f4")
+        write_array(f, mesh.normals, "<f4")
+        write_array(f, mesh.tangents, "<f4")
+        write_array(f, mesh.colors, "<u4")
+        write_array(f, mesh.uv0, "<f4")
+        write_array(f, mesh.uv1, "<f4")
+
+        f.write(count_struct.pack(mesh.num_triangles))
+        write_array(f, mesh.triangles, "<i4")
+        write_array(f, mesh.material_ids, "<i4")
+
+        #Cached vertex indices per direction
+        for direction in CACHED_DIRECTIONS:
+            indices = mesh.cached_indices.get(direction, ())
+            f.write(count_struct.pack(len(indices)))
+            write_array(f, indices, "<i4")
@@ -0,0 +1,335 @@
+import hashlib
+import json
+import os
+import shutil
+import sys
+import tempfile
+import numpy as np
+
+from mesh_data import CACHED_DIRECTIONS, MeshData, Material, Point, as_array
+
+#Persistent cache of parsed .mesh arrays, no bpy required
+
+CACHE_VERSION = 2
+DEFAULT_MAX_SIZE = 512 * 1024 * 1024
+HASH_BLOCK_SIZE = 1 << 20
+
+COUNT_LABELS = ("NumMaterials", "NumPoints", "NumVertices", "NumTriangles")
+
+def get_default_cache_dir():
+    """
+    Returns the per-user cache directory, SOASE_MESH_CACHE_DIR overrides it
+    """
+    if os.environ.get("SOASE_MESH_CACHE_DIR"):
+        return os.environ["SOASE_MESH_CACHE_DIR"]
+    if sys.platform == "win32":
+        base = os.environ.get("LOCALAPPDATA", os.path.expanduser("~"))
+    elif sys.platform == "darwin":
+        base = os.path.expanduser("~/Library/Caches")
+    else:
+        base = os.environ.get("XDG_CACHE_HOME", os.path.expanduser("~/.cache"))
+    return os.path.join(base, "soase-mesh")
+
+def get_default_max_size():
+    """
+    Returns the cache size cap in bytes, SOASE_MESH_CACHE_SIZE overrides it in megabytes
+    """
+    if os.environ.get("SOASE_MESH_CACHE_SIZE"):
+        return int(float(os.environ["SOASE_MESH_CACHE_SIZE"]) * 1024 * 1024)
+    return DEFAULT_MAX_SIZE
+
+def hash_file(filepath):
+    digest = hashlib.blake2b(digest_size=16)
+    with open(filepath, 'rb') as f:
+        for block in iter(lambda: f.read(HASH_BLOCK_SIZE), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def mesh_to_arrays(mesh):
+    """
+    Flattens MeshData to a dict of arrays that np.savez can store without pickling
+    """
+    points = mesh.points
+    arrays = {
+        "version": np.array(CACHE_VERSION),
+        "positions": mesh.positions,
+        "normals": mesh.normals,
+        "tangents": mesh.tangents,
+        "colors": mesh.colors,
+        "uv0": mesh.uv0,
+        "uv1": mesh.uv1,
+        "triangles": mesh.triangles,
+        "material_ids": mesh.material_ids,
+        "materials": np.array([[str(value) for value in material] for material in mesh.materials], dtype=str).reshape(-1, len(Material._fields)),
+        "point_names": np.array([point.name for point in points], dtype=str),
+        "point_positions": np.array([point.position for point in points], dtype=np.float64).reshape(-1, 3),
+        "point_orientations": np.array([point.orientation for point in points], dtype=np.float64).reshape(-1, 3, 3),
+        "header": np.array([mesh.max_diffuse_mip_level,
+                            mesh.has_valid_tangents,
+                            mesh.bounding_radius,
+                            *mesh.max_extents,
+                            *mesh.min_extents], dtype=np.float64),
+        "declared_counts": np.array([mesh.declared_counts.get(label, -1) for label in COUNT_LABELS], dtype=np.int64),
+    }
+    for direction, indices in mesh.cached_indices.items():
+        arrays["cached_" + direction] = indices
+    return arrays
+
+def mesh_from_arrays(arrays):
+    """
+    Rebuilds MeshData from the dict written by mesh_to_arrays
+    """
+    materials = [Material(*row[:-1], float(row[-1])) for row in arrays["materials"].tolist()]
+    points = [Point(name, tuple(position), tuple(map(tuple, orientation)))
+                for name, position, orientation in zip(arrays["point_names"].tolist(),
+                                                        arrays["point_positions"].tolist(),
+                                                        arrays["point_orientations"].tolist())]
+
+    mesh = MeshData(positions=arrays["positions"],
+                    normals=arrays["normals"],
+                    tangents=arrays["tangents"],
+                    colors=arrays["colors"],
+                    uv0=arrays["uv0"],
+                    uv1=arrays["uv1"],
+                    triangles=arrays["triangles"],
+                    material_ids=arrays["material_ids"],
+                    materials=materials,
+                    points=points,
+                    cached_indices={direction: arrays["cached_" + direction] for direction in CACHED_DIRECTIONS})
+
+    header = arrays["header"].tolist()
+    mesh.max_diffuse_mip_level = int(header[0])
+    mesh.has_valid_tangents = bool(header[1])
+    mesh.bounding_radius = header[2]
+    mesh.max_extents = tuple(header[3:6])
+    mesh.min_extents = tuple(header[6:9])
+    mesh.declared_counts = {label: count for label, count in zip(COUNT_LABELS, arrays["declared_counts"].tolist()) if count >= 0}
+    return mesh
+
+class ParseCache:
+    """
+    Compressed .npz copies of parsed meshes in a directory, evicted least recently used first
+
+    Entries are keyed by the absolute path, size, modification time and a hash
+    of the file contents, so any change to the source file misses the cache.
+    Reading an entry refreshes its modification time, which is what eviction
+    orders by.
+    """
+
+    def __init__(self, directory=None, max_size=None):
+        self.directory = directory or get_default_cache_dir()
+        self.max_size = get_default_max_size() if max_size is None else max_size
+
+    def get_entry_path(self, filepath):
+        stat = os.stat(filepath)
+        key = "{}|{}|{}|{}|{}".format(CACHE_VERSION,
+                                        os.path.abspath(filepath),
+                                        stat.st_size,
+                                        stat.st_mtime_ns,
+                                        hash_file(filepath))
+        name = hashlib.blake2b(key.encode("utf-8"), digest_size=16).hexdigest()
+        return os.path.join(self.directory, name + ".npz")
+
+    def load(self, filepath):
+        """
+        Returns the cached MeshData for filepath, or None on a miss
+        """
+        entry_path = self.get_entry_path(filepath)
+        try:
+            with np.load(entry_path, allow_pickle=False) as arrays:
+                if int(arrays["version"]) != CACHE_VERSION:
+                    return None
+                mesh = mesh_from_arrays(arrays)
+        except (OSError, KeyError, ValueError):
+            return None
+
+        os.utime(entry_path)
+        return mesh
+
+    def store(self, filepath, mesh):
+        """
+        Saves MeshData for filepath and evicts old entries beyond the size cap
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        entry_path = self.get_entry_path(filepath)
+
+        #Write to a temporary file first so readers never see half an entry
+        handle, temp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(handle, 'wb') as f:
+                np.savez_compressed(f, **mesh_to_arrays(mesh))
+            os.replace(temp_path, entry_path)
+        except OSError:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
+        self.evict()
+
+    def evict(self):
+        """
+        Removes least recently used entries until the cache fits in max_size
+        """
+        entries = []
+        for name in os.listdir(self.directory):
+            if name.endswith(".npz"):
+                path = os.path.join(self.directory, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+
+        #Other processes may be evicting at the same time
+        total = sum(size for mtime, size, path in entries)
+        for mtime, size, path in sorted(entries):
+            if total <= self.max_size:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+
+    def clear(self):
+        if not os.path.isdir(self.directory):
+            return
+        for name in os.listdir(self.directory):
+            if name.endswith(".npz"):
+                os.remove(os.path.join(self.directory, name))
+
+
+def hash_values(values):
+    """
+    Returns a digest of a sequence of arrays and plain Python values
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    for value in values:
+        if isinstance(value, np.ndarray):
+            digest.update("{}{}".format(value.dtype.str, value.shape).encode("utf-8"))
+            digest.update(np.ascontiguousarray(value).data)
+        else:
+            digest.update(repr(value).encode("utf-8"))
+    return digest.hexdigest()
+
+def get_corner_signature(vertex_indices, positions, uvs):
+    """
+    Returns a digest of a mesh's face corners, vertex positions and first UV map
+
+    Stored per corner values such as tangents are only still valid while this
+    matches. vertex_indices are int32 per corner, positions float32 (n, 3) and
+    uvs float32 (corners, 2) as Blender stores them, before any V flip.
+    """
+    return hash_values([as_array(vertex_indices, np.int32),
+                        as_array(positions, np.float32, 3),
+                        as_array(uvs, np.float32, 2)])
+
+class TargetSections:
+    """
+    Formatted sections of one exported file, see SectionCache
+
+    lookup() tells whether a section's inputs match the last successful
+    export, sections that did not are written through open_pending() and only
+    become the cached copy once commit() is called after the whole file is written.
+    """
+
+    def __init__(self, directory, cache=None):
+        self.directory = directory
+        self.cache = cache
+        self.pending = {}
+        try:
+            with open(os.path.join(directory, "hashes.json")) as f:
+                self.hashes = json.load(f)
+        except (OSError, ValueError):
+            self.hashes = {}
+
+    def get_section_path(self, name):
+        return os.path.join(self.directory, name + ".txt")
+
+    def lookup(self, name, values):
+        """
+        Returns the path of the cached text of section name if values are unchanged, else None
+        """
+        digest = hash_values(values)
+        path = self.get_section_path(name)
+        if self.hashes.get(name) == digest and os.path.exists(path):
+            return path
+        self.pending[name] = (digest, None)
+        return None
+
+    def open_pending(self, name):
+        """
+        Returns a new text file for section name, looked up and missed before
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        handle, temp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        self.pending[name] = (self.pending[name][0], temp_path)
+        return os.fdopen(handle, 'w', encoding='utf-8')
+
+    def commit(self):
+        for name, (digest, temp_path) in self.pending.items():
+            if temp_path is not None:
+                os.replace(temp_path, self.get_section_path(name))
+                self.hashes[name] = digest
+        self.pending = {}
+
+        handle, temp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        with os.fdopen(handle, 'w') as f:
+            json.dump(self.hashes, f)
+        os.replace(temp_path, os.path.join(self.directory, "hashes.json"))
+
+        if self.cache is not None:
+            self.cache.evict()
+
+    def discard(self):
+        for digest, temp_path in self.pending.values():
+            if temp_path is not None and os.path.exists(temp_path):
+                os.remove(temp_path)
+        self.pending = {}
+
+class SectionCache:
+    """
+    Formatted text sections of previously exported files, keyed by target path
+
+    Re-exporting to the same path splices in the cached text of every section
+    whose source arrays hash the same as last time, so only changed sections
+    are formatted again. Each target keeps its sections in its own directory,
+    and like ParseCache whole targets are evicted least recently exported
+    first once they add up to more than max_size.
+    """
+
+    def __init__(self, directory=None, max_size=None):
+        self.directory = directory or os.path.join(get_default_cache_dir(), "sections")
+        self.max_size = get_default_max_size() if max_size is None else max_size
+
+    def get_target(self, filepath):
+        name = hashlib.blake2b(os.path.abspath(filepath).encode("utf-8"), digest_size=16).hexdigest()
+        return TargetSections(os.path.join(self.directory, name), self)
+
+    def evict(self):
+        """
+        Removes the least recently exported targets until the cache fits in max_size
+
+        A target's age is that of its hashes.json, which every commit rewrites.
+        """
+        targets = []
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            try:
+                mtime = os.stat(os.path.join(path, "hashes.json")).st_mtime
+                size = sum(entry.stat().st_size for entry in os.scandir(path) if entry.is_file())
+            except FileNotFoundError:
+                continue
+            targets.append((mtime, size, path))
+
+        #Other processes may be evicting at the same time
+        total = sum(size for mtime, size, path in targets)
+        for mtime, size, path in sorted(targets):
+            if total <= self.max_size:
+                break
+            shutil.rmtree(path, ignore_errors=True)
+            total -= size
+
+    def clear(self):
+        if os.path.isdir(self.directory):
+            shutil.rmtree(self.directory)
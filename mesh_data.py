@@ -0,0 +1,622 @@
+import collections
+import numpy as np
+
+#Shared .mesh data model, deliberately free of bpy so it can be used outside Blender
+
+Material = collections.namedtuple("Material", [
+    "diffuse_texture",
+    "self_illumination_texture",
+    "normal_texture",
+    "displacement_texture",
+    "team_color_texture",
+    "diffuse",
+    "ambient",
+    "specular",
+    "emissive",
+    "glossiness",
+], defaults=("", "", "", "", "", "ffffffff", "ffffffff", "ffffffff", "ffffffff", 50.0))
+
+#orientation is three (x, y, z) rows
+Point = collections.namedtuple("Point", ["name", "position", "orientation"])
+
+#Face corner attributes the importer keeps the file's tangents and uint32 colors in
+TANGENT_ATTRIBUTE = "mesh_tangent"
+COLOR_ATTRIBUTE = "mesh_color"
+
+#Mesh custom property with the corner signature the stored tangents were made for
+TANGENT_SIGNATURE = "mesh_tangent_signature"
+
+#Directions the file caches extreme vertices for, in file axes
+CACHED_DIRECTIONS = {
+    "UP": (0.0, 1.0, 0.0),
+    "DOWN": (0.0, -1.0, 0.0),
+    "LEFT": (-1.0, 0.0, 0.0),
+    "RIGHT": (1.0, 0.0, 0.0),
+    "FRONT": (0.0, 0.0, 1.0),
+    "BACK": (0.0, 0.0, -1.0),
+}
+
+
+def as_array(values, dtype, width=None):
+    """
+    Returns values as a contiguous array of dtype
+
+    If width is given the array is reshaped to (n, width), which also works for
+    flat buffers and empty input.
+    """
+    array = np.ascontiguousarray(values, dtype=dtype)
+    if width is not None:
+        array = array.reshape(-1, width)
+    return array
+
+
+class MeshData:
+    """
+    Columnar container for everything stored in a .mesh file
+
+    Vertex attributes are (n, 3) or (n, 2) float32 arrays, colors are uint32,
+    triangles are (n, 3) int32 vertex indices with a matching int32 material id
+    array. Materials and points are short lists of Material and Point records,
+    cached_indices maps each CACHED_DIRECTIONS name to an int32 index array.
+    """
+
+    def __init__(self,
+                    positions=(),
+                    normals=None,
+                    tangents=None,
+                    colors=None,
+                    uv0=None,
+                    uv1=None,
+                    triangles=(),
+                    material_ids=None,
+                    materials=None,
+                    points=None,
+                    cached_indices=None):
+        self.positions = as_array(positions, np.float32, 3)
+        number_verts = len(self.positions)
+
+        if normals is None:
+            normals = np.zeros((number_verts, 3))
+        if tangents is None:
+            tangents = np.zeros((number_verts, 3))
+        if colors is None:
+            colors = np.zeros(number_verts)
+        if uv0 is None:
+            uv0 = np.zeros((number_verts, 2))
+
+        self.normals = as_array(normals, np.float32, 3)
+        self.tangents = as_array(tangents, np.float32, 3)
+        self.colors = as_array(colors, np.uint32)
+        self.uv0 = as_array(uv0, np.float32, 2)
+        #A copy, so editing one UV set in place never changes the other
+        self.uv1 = self.uv0.copy() if uv1 is None else as_array(uv1, np.float32, 2)
+
+        self.triangles = as_array(triangles, np.int32, 3)
+        if material_ids is None:
+            material_ids = np.zeros(len(self.triangles))
+        self.material_ids = as_array(material_ids, np.int32)
+
+        if materials is None:
+            materials = [Material()]
+        self.materials = list(materials)
+        self.points = list(points or [])
+
+        #Extreme vertex indices per CACHED_DIRECTIONS entry
+        cached_indices = cached_indices or {}
+        self.cached_indices = {direction: as_array(cached_indices.get(direction, ()), np.int32)
+                                for direction in CACHED_DIRECTIONS}
+
+        #Header values
+        self.max_diffuse_mip_level = 0
+        self.has_valid_tangents = True
+        self.bounding_radius = 0.0
+        self.max_extents = (0.0, 0.0, 0.0)
+        self.min_extents = (0.0, 0.0, 0.0)
+
+        #Section counts as written in the file this was read from
+        self.declared_counts = {}
+
+    @property
+    def num_vertices(self):
+        return len(self.positions)
+
+    @property
+    def num_triangles(self):
+        return len(self.triangles)
+
+    def select_vertices(self, keep, remap):
+        """
+        Rebuilds the vertex rows from old indices keep, in place
+
+        remap gives the new index of every old vertex, or -1 for dropped ones,
+        and is applied to the triangles and cached_indices. Cached vertices that
+        were dropped or merged into an earlier one are left out, so each list
+        keeps its most extreme first order.
+        """
+        self.positions = self.positions[keep]
+        self.normals = self.normals[keep]
+        self.tangents = self.tangents[keep]
+        self.colors = self.colors[keep]
+        self.uv0 = self.uv0[keep]
+        self.uv1 = self.uv1[keep]
+        self.triangles = remap[self.triangles]
+
+        for direction, indices in self.cached_indices.items():
+            indices = remap[indices]
+            indices = indices[indices >= 0]
+            _, first = np.unique(indices, return_index=True)
+            self.cached_indices[direction] = indices[np.sort(first)]
+        return self
+
+    def __repr__(self):
+        return "<MeshData {} vertices, {} triangles, {} materials, {} points>".format(
+            self.num_vertices, self.num_triangles, len(self.materials), len(self.points))
+
+
+#A small mesh with awkward values for checking the file formats
+test_mesh = MeshData(
+                positions=[[0.12334, 343.32432, 123.576567]],
+                normals=[[3654.12334, 123.33452, 123.576567]],
+                tangents=[[0.12334, 12.123, 123.45]],
+                colors=[0],
+                uv0=[[0.2344345, 0.34554654]],
+                uv1=[[0.123343, 0.123343]],
+                triangles=[[0, 1, 2]],
+                material_ids=[0],
+                points=[
+                    Point("Test", (0.12334, 343.32432, 123.576567),
+                        ((3654.12334, 123.33452, 123.576567),
+                        (0.12334, 12.123, 123.45),
+                        (0.12334, 23.123, 56.45)))
+                ]
+            )
+
+
+def convert_axes(vectors, matrix):
+    """
+    Applies an axis conversion matrix to an (n, 3) array in one multiply
+
+    Rows are treated as vectors on the left, the same as vector @ matrix in mathutils.
+    """
+    return as_array(as_array(vectors, np.float32, 3) @ np.asarray(matrix, dtype=np.float32), np.float32, 3)
+
+def convert_point_axes(points, matrix):
+    """
+    Returns points with positions and orientations converted in one batch
+    """
+    if not points:
+        return []
+
+    matrix = np.asarray(matrix, dtype=np.float32)
+    positions = convert_axes([point.position for point in points], matrix)
+    orientations = np.asarray([point.orientation for point in points], dtype=np.float32) @ matrix
+
+    return [Point(point.name, tuple(position), tuple(map(tuple, orientation)))
+            for point, position, orientation in zip(points, positions.tolist(), orientations.tolist())]
+
+def convert_mesh_axes(mesh, matrix):
+    """
+    Converts positions, normals, tangents and points of a MeshData in place
+    """
+    mesh.positions = convert_axes(mesh.positions, matrix)
+    mesh.normals = convert_axes(mesh.normals, matrix)
+    mesh.tangents = convert_axes(mesh.tangents, matrix)
+    mesh.points = convert_point_axes(mesh.points, matrix)
+    return mesh
+
+def weld_vertices(mesh, tolerance=1e-6):
+    """
+    Merges vertices whose attributes all match, in place
+
+    Two vertices match when every position, normal, tangent and UV component
+    differs by at most tolerance and their colors are equal; with a tolerance
+    of 0 they must be bit for bit identical. Vertices merge into the first
+    matching vertex in order without chaining, like weld_positions, so kept
+    vertices stay in order of first use and the triangles are remapped onto them.
+    """
+    if mesh.num_vertices == 0:
+        return mesh
+
+    attributes = [mesh.positions, mesh.normals, mesh.tangents, mesh.uv0, mesh.uv1]
+    if tolerance > 0:
+        values = np.hstack(attributes)
+
+        def is_close(a, b):
+            return (np.abs(values[a] - values[b]).max(axis=1) <= tolerance) & (mesh.colors[a] == mesh.colors[b])
+
+        number_verts = mesh.num_vertices
+        rows = np.hstack([attribute.view(np.uint32) for attribute in attributes] + [mesh.colors[:, None]])
+        target = find_merge_targets(rows, mesh.positions, tolerance, is_close)
+        keep = np.flatnonzero(target == np.arange(number_verts))
+        compact = np.zeros(number_verts, dtype=np.int32)
+        compact[keep] = np.arange(len(keep), dtype=np.int32)
+        remap = compact[target]
+    else:
+        keys = [attribute.view(np.int32).astype(np.int64) for attribute in attributes]
+        keys.append(mesh.colors.astype(np.int64)[:, None])
+
+        rows = np.ascontiguousarray(np.hstack(keys))
+        rows = rows.view(np.dtype((np.void, rows.dtype.itemsize * rows.shape[1]))).ravel()
+        _, first, inverse = np.unique(rows, return_index=True, return_inverse=True)
+
+        #Number the welded vertices in order of first appearance
+        order = np.argsort(first)
+        remap = np.empty(len(order), dtype=np.int32)
+        remap[order] = np.arange(len(order), dtype=np.int32)
+        keep = first[order]
+        remap = remap[inverse.ravel()]
+
+    return mesh.select_vertices(keep, remap)
+
+def validate_mesh(mesh):
+    """
+    Checks a MeshData for inconsistencies, returning a list of problem descriptions
+
+    Declared section counts are compared with the data actually read, and the
+    triangle vertex indices and material ids are checked against their ranges.
+    """
+    problems = []
+
+    actual_counts = {
+        "NumMaterials": len(mesh.materials),
+        "NumPoints": len(mesh.points),
+        "NumVertices": mesh.num_vertices,
+        "NumTriangles": mesh.num_triangles,
+    }
+    for label, declared in mesh.declared_counts.items():
+        if label in actual_counts and declared != actual_counts[label]:
+            problems.append("{} is {} but {} were read".format(label, declared, actual_counts[label]))
+
+    number_verts = mesh.num_vertices
+    for name in ("normals", "tangents", "colors", "uv0", "uv1"):
+        if len(getattr(mesh, name)) != number_verts:
+            problems.append("{} has {} entries for {} vertices".format(name, len(getattr(mesh, name)), number_verts))
+
+    if len(mesh.material_ids) != mesh.num_triangles:
+        problems.append("{} material ids for {} triangles".format(len(mesh.material_ids), mesh.num_triangles))
+
+    if mesh.num_triangles:
+        bad_indices = np.count_nonzero((mesh.triangles < 0) | (mesh.triangles >= number_verts))
+        if bad_indices:
+            problems.append("{} triangle vertex indices outside 0..{}".format(bad_indices, number_verts - 1))
+
+        bad_materials = np.count_nonzero((mesh.material_ids < 0) | (mesh.material_ids >= len(mesh.materials)))
+        if bad_materials:
+            problems.append("{} triangles use a material index outside 0..{}".format(bad_materials, len(mesh.materials) - 1))
+
+        degenerate = np.count_nonzero((mesh.triangles[:, 0] == mesh.triangles[:, 1])
+                                        | (mesh.triangles[:, 1] == mesh.triangles[:, 2])
+                                        | (mesh.triangles[:, 0] == mesh.triangles[:, 2]))
+        if degenerate:
+            problems.append("{} degenerate triangles".format(degenerate))
+
+    for direction, indices in mesh.cached_indices.items():
+        bad_cached = np.count_nonzero((indices < 0) | (indices >= number_verts))
+        if bad_cached:
+            problems.append("{} cached {} vertex indices outside 0..{}".format(bad_cached, direction, number_verts - 1))
+
+    for name in ("positions", "normals", "tangents", "uv0", "uv1"):
+        not_finite = np.count_nonzero(~np.isfinite(getattr(mesh, name)))
+        if not_finite:
+            problems.append("{} non-finite values in {}".format(not_finite, name))
+
+    return problems
+
+def normalize_rows(vectors):
+    lengths = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.where(lengths > 0, lengths, 1)
+
+def transform_mesh(mesh, matrix):
+    """
+    Applies a 4x4 object to world matrix to a MeshData in place
+
+    Positions get the full affine transform, tangents the linear part and
+    normals its inverse transpose, both renormalised. A mirroring matrix turns
+    the triangles inside out, so their winding is reversed to match.
+    """
+    matrix = np.asarray(matrix, dtype=np.float64)
+    linear = matrix[:3, :3]
+
+    mesh.positions = as_array(mesh.positions @ linear.T + matrix[:3, 3], np.float32, 3)
+    mesh.tangents = as_array(normalize_rows(mesh.tangents @ linear.T), np.float32, 3)
+    mesh.normals = as_array(normalize_rows(mesh.normals @ np.linalg.inv(linear)), np.float32, 3)
+    if np.linalg.det(linear) < 0:
+        mesh.triangles = as_array(mesh.triangles[:, [0, 2, 1]], np.int32, 3)
+    return mesh
+
+def merge_meshes(meshes, materials=None, points=None):
+    """
+    Concatenates MeshData parts into one, offsetting each part's triangle indices
+
+    Material ids must already refer to the shared materials list.
+    """
+    offsets = np.cumsum([0] + [mesh.num_vertices for mesh in meshes[:-1]])
+
+    return MeshData(positions=np.concatenate([mesh.positions for mesh in meshes]),
+                    normals=np.concatenate([mesh.normals for mesh in meshes]),
+                    tangents=np.concatenate([mesh.tangents for mesh in meshes]),
+                    colors=np.concatenate([mesh.colors for mesh in meshes]),
+                    uv0=np.concatenate([mesh.uv0 for mesh in meshes]),
+                    uv1=np.concatenate([mesh.uv1 for mesh in meshes]),
+                    triangles=np.concatenate([mesh.triangles + offset for mesh, offset in zip(meshes, offsets)]),
+                    material_ids=np.concatenate([mesh.material_ids for mesh in meshes]),
+                    materials=materials,
+                    points=points)
+
+def calc_cached_indices(mesh, tolerance=0.01, max_count=64):
+    """
+    Finds the vertices on or near the extreme in each of CACHED_DIRECTIONS, in place
+
+    A vertex counts when its distance along the direction is within tolerance
+    of the mesh's extent along that direction from the extreme. At most
+    max_count indices are kept per direction, the most extreme first.
+    """
+    mesh.cached_indices = {direction: np.zeros(0, dtype=np.int32) for direction in CACHED_DIRECTIONS}
+    if mesh.num_vertices == 0:
+        return mesh
+
+    directions = np.array(list(CACHED_DIRECTIONS.values()), dtype=np.float32)
+    distances = mesh.positions @ directions.T
+
+    for column, direction in enumerate(CACHED_DIRECTIONS):
+        distance = distances[:, column]
+        extreme = distance.max()
+        threshold = extreme - tolerance * (extreme - distance.min())
+        near = np.flatnonzero(distance >= threshold)
+        near = near[np.argsort(-distance[near], kind="stable")][:max_count]
+        mesh.cached_indices[direction] = near.astype(np.int32)
+    return mesh
+
+def calc_bounds(mesh):
+    """
+    Sets the bounding header values from the vertex positions, in place
+
+    The extents are the exact axis aligned box. The file only stores a radius,
+    which the game centres on the model origin, so the tightest valid value is
+    the distance to the farthest vertex rather than a fitted sphere.
+    """
+    if mesh.num_vertices == 0:
+        mesh.bounding_radius = 0.0
+        mesh.max_extents = (0.0, 0.0, 0.0)
+        mesh.min_extents = (0.0, 0.0, 0.0)
+        return mesh
+
+    positions = mesh.positions.astype(np.float64)
+    mesh.max_extents = tuple(positions.max(axis=0).tolist())
+    mesh.min_extents = tuple(positions.min(axis=0).tolist())
+    mesh.bounding_radius = float(np.sqrt(np.einsum("ij,ij->i", positions, positions).max()))
+    return mesh
+
+#Cell offsets covering each pair of neighbouring cells once, the cell itself first
+HALF_NEIGHBOURS = np.array([(x, y, z) for x in (-1, 0, 1) for y in (-1, 0, 1) for z in (-1, 0, 1)
+                            if (x, y, z) >= (0, 0, 0)], dtype=np.int64)
+
+def get_cell_keys(cells, axis_values):
+    """
+    Returns a key per (n, 3) cell that sorts the same as the cells
+
+    Keys are int64 built from each coordinate's rank in axis_values, the
+    sorted coordinates seen on each axis. A cell with a coordinate not in them
+    gets -1, which no known cell has. When there are too many distinct
+    coordinates for int64 keys the cells are viewed as records and compared
+    field by field instead, which is much slower.
+    """
+    sizes = [len(values) for values in axis_values]
+    if sizes[0] * sizes[1] * sizes[2] >= 2 ** 63:
+        row = np.dtype([("x", np.int64), ("y", np.int64), ("z", np.int64)])
+        return np.ascontiguousarray(cells, dtype=np.int64).view(row).ravel()
+
+    keys = np.zeros(len(cells), dtype=np.int64)
+    known = np.ones(len(cells), dtype=bool)
+    for axis, values in enumerate(axis_values):
+        rank = np.minimum(np.searchsorted(values, cells[:, axis]), len(values) - 1)
+        known &= values[rank] == cells[:, axis]
+        keys = keys * len(values) + rank
+    keys[~known] = -1
+    return keys
+
+def find_cells(table_keys, axis_values, cells):
+    """
+    Returns the row of each cell in table_keys, the sorted unique keys of the known cells, or -1
+    """
+    keys = get_cell_keys(cells, axis_values)
+    rows = np.minimum(np.searchsorted(table_keys, keys), len(table_keys) - 1)
+    rows[table_keys[rows] != keys] = -1
+    return rows
+
+#Candidate pairs are made and tested at most this many at a time
+PAIR_CHUNK_SIZE = 1 << 22
+
+#Each vertex is only paired with this many of the lowest indexed vertices in
+#its own and each neighbouring cell, the ones kept first in index order
+MAX_CELL_PAIRS = 64
+
+def iter_pairs(order, starts_a, counts_a, starts_b, counts_b):
+    """
+    Yields every pair of a vertex in a run of order with a vertex in the matching other run
+
+    Runs are order[start:start + count]. Pairs come as (a, b) index arrays of
+    at most PAIR_CHUNK_SIZE, so crowded cells never need all their pairs in
+    memory at once.
+    """
+    sizes = counts_a * counts_b
+    ends = np.cumsum(sizes)
+    total = int(ends[-1]) if len(ends) else 0
+
+    for first in range(0, total, PAIR_CHUNK_SIZE):
+        last = min(first + PAIR_CHUNK_SIZE, total)
+        runs = np.arange(np.searchsorted(ends, first, side="right"), np.searchsorted(ends, last - 1, side="right") + 1)
+        run = np.repeat(runs, np.minimum(ends[runs], last) - np.maximum(ends[runs] - sizes[runs], first))
+        local = np.arange(first, last) - (ends[run] - sizes[run])
+        width = counts_b[run]
+        yield order[starts_a[run] + local // width], order[starts_b[run] + local % width]
+
+def iter_cell_pairs(order, starts, counts, cells_a, cells_b):
+    """
+    Yields candidate pairs between the vertices of cells_a and the matching cells_b, see iter_pairs
+
+    Vertices of cell c are order[starts[c]:starts[c] + counts[c]], lowest
+    index first. Every vertex is paired with the first MAX_CELL_PAIRS
+    vertices of the other cell, so a cell crowded with thousands of distinct
+    positions makes pairs in proportion to its size instead of its square.
+    """
+    counts_a = counts[cells_a]
+    counts_b = counts[cells_b]
+    heads_a = np.minimum(counts_a, MAX_CELL_PAIRS)
+    heads_b = np.minimum(counts_b, MAX_CELL_PAIRS)
+    yield from iter_pairs(order, starts[cells_a], heads_a, starts[cells_b], counts_b)
+
+    crowded = counts_a > MAX_CELL_PAIRS
+    yield from iter_pairs(order, starts[cells_a][crowded] + MAX_CELL_PAIRS, (counts_a - heads_a)[crowded],
+                            starts[cells_b][crowded], heads_b[crowded])
+
+def resolve_merges(number_verts, lower, upper):
+    """
+    Merges vertices connected by close pairs (lower < upper) like a greedy pass in index order
+
+    Going through the vertices in order, a vertex merges into the lowest
+    indexed vertex it is close to that was itself kept, otherwise it is kept.
+    Every merged vertex is therefore close to its target and merges never
+    chain. Decided a batch at a time: a vertex is decided once the lowest kept
+    vertex it is close to comes before every undecided one, or once all of
+    them are decided, so a crowded cluster takes two passes rather than one
+    per vertex. Returns the target of every vertex.
+    """
+    target = np.arange(number_verts)
+    kept = np.ones(number_verts, dtype=bool)
+    decided = np.ones(number_verts, dtype=bool)
+    decided[upper] = False
+
+    while len(upper):
+        lowest_undecided = np.full(number_verts, number_verts)
+        undecided = ~decided[lower]
+        np.minimum.at(lowest_undecided, upper[undecided], lower[undecided])
+
+        lowest_kept = np.full(number_verts, number_verts)
+        close_to_kept = ~undecided & kept[lower]
+        np.minimum.at(lowest_kept, upper[close_to_kept], lower[close_to_kept])
+
+        merged = ~decided & (lowest_kept < lowest_undecided)
+        target[merged] = lowest_kept[merged]
+        kept[merged] = False
+        decided |= merged | (lowest_undecided == number_verts)
+
+        pending = ~decided[upper]
+        lower = lower[pending]
+        upper = upper[pending]
+
+    return target
+
+def find_first_copies(rows):
+    """
+    Returns, for each row of an (n, k) integer array, the index of the first row bitwise equal to it
+
+    Rows are sorted by a 64 bit hash and equal neighbours grouped. A hash
+    collision can leave a later copy pointing at itself, which only costs
+    the callers some speed since they still compare such rows by value.
+    """
+    digest = np.zeros(len(rows), dtype=np.uint64)
+    for column in rows.T:
+        digest = (digest ^ column.astype(np.uint64)) * np.uint64(0x9E3779B97F4A7C15)
+    order = np.argsort(digest, kind="stable")
+
+    ordered = rows[order]
+    new_run = np.ones(len(rows), dtype=bool)
+    new_run[1:] = np.any(ordered[1:] != ordered[:-1], axis=1)
+    runs = np.cumsum(new_run) - 1
+
+    #The stable sort puts the lowest index first in every run
+    first = np.empty(len(rows), dtype=np.int64)
+    first[order] = order[new_run][runs]
+    return first
+
+def find_merge_targets(rows, positions, tolerance, is_close):
+    """
+    Returns the target of every vertex merged greedily by is_close, see resolve_merges
+
+    Copies of a vertex, with bitwise equal rows, always merge wherever their
+    first copy does, so only first copies are paired and resolved. This keeps
+    meshes with many vertices at one position from making a pair per two of
+    them.
+    """
+    first = find_first_copies(rows)
+    unique = np.flatnonzero(first == np.arange(len(rows)))
+    rank = np.zeros(len(rows), dtype=np.int64)
+    rank[unique] = np.arange(len(unique))
+
+    lower, upper = find_close_pairs(positions[unique], tolerance,
+                                    lambda a, b: is_close(unique[a], unique[b]))
+    target = unique[resolve_merges(len(unique), lower, upper)]
+    return target[rank[first]]
+
+def find_close_pairs(positions, tolerance, is_close):
+    """
+    Returns (lower, upper) index arrays of the vertex pairs is_close accepts, lower < upper
+
+    Positions are binned into cells the size of tolerance, so every pair of
+    vertices no further than tolerance apart on each axis shares a cell or
+    sits in neighbouring ones. Only those candidate pairs are passed to
+    is_close(a, b), a batch at a time, which returns a mask of the close ones.
+    In a cell holding more than MAX_CELL_PAIRS vertices each one is only
+    paired with the lowest indexed ones, see iter_cell_pairs, so a few close
+    vertices in such a crowd may be missed.
+    """
+    positions = as_array(positions, np.float64, 3)
+    number_verts = len(positions)
+
+    #Vertices sorted by cell, each cell a run in order
+    cells = np.floor(positions / tolerance).astype(np.int64)
+    axis_values = [np.unique(cells[:, axis]) for axis in range(3)]
+    keys = get_cell_keys(cells, axis_values)
+    order = np.argsort(keys, kind="stable")
+    sorted_keys = keys[order]
+    starts = np.flatnonzero(np.concatenate([[True], sorted_keys[1:] != sorted_keys[:-1]]))
+    counts = np.diff(np.append(starts, number_verts))
+    table_keys = sorted_keys[starts]
+    unique_cells = cells[order[starts]]
+    cell_ids = np.arange(len(starts))
+
+    lower = [np.zeros(0, dtype=np.int64)]
+    upper = [np.zeros(0, dtype=np.int64)]
+    for offset in HALF_NEIGHBOURS:
+        if offset.any():
+            neighbours = find_cells(table_keys, axis_values, unique_cells + offset)
+            found = neighbours >= 0
+            pairs = iter_cell_pairs(order, starts, counts, cell_ids[found], neighbours[found])
+        else:
+            pairs = iter_cell_pairs(order, starts, counts, cell_ids[counts > 1], cell_ids[counts > 1])
+        for a, b in pairs:
+            if not offset.any():
+                ordered = a < b
+                a = a[ordered]
+                b = b[ordered]
+            close = is_close(a, b)
+            lower.append(np.minimum(a[close], b[close]))
+            upper.append(np.maximum(a[close], b[close]))
+
+    return np.concatenate(lower), np.concatenate(upper)
+
+def weld_positions(positions, tolerance=0.0001):
+    """
+    Finds vertices to merge by position, like remove doubles with a distance of tolerance
+
+    Candidate pairs from find_close_pairs are tested by their real distance
+    and merged in index order without chaining, see resolve_merges. Returns
+    (keep, remap): the indices of the surviving vertices in their original
+    order and, for every input vertex, the index of the kept vertex it merges into.
+    """
+    positions = as_array(positions, np.float64, 3)
+    number_verts = len(positions)
+    if number_verts == 0 or tolerance <= 0:
+        return np.arange(number_verts), np.arange(number_verts, dtype=np.int32)
+
+    def is_close(a, b):
+        difference = positions[a] - positions[b]
+        return np.einsum("ij,ij->i", difference, difference) <= tolerance * tolerance
+
+    target = find_merge_targets(positions.view(np.uint64), positions, tolerance, is_close)
+
+    keep = np.flatnonzero(target == np.arange(number_verts))
+    compact = np.zeros(number_verts, dtype=np.int32)
+    compact[keep] = np.arange(len(keep), dtype=np.int32)
+    return keep, compact[target]
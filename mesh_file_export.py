@@ -1,435 +1,498 @@
-import bpy
-import bmesh
-import copy
-import math
-import bpy_extras
-
-test_points = [
-                ["Test", [0.12334, 343.32432, 123.576567], 
-                    [3654.12334, 123.33452, 123.576567],
-                    [0.12334, 12.123, 123.45],
-                    [0.12334, 23.123, 56.45]
-                ]
-            ]
-
-test_vertices = [
-                    [
-                        [0.12334, 343.32432, 123.576567], 
-                        [3654.12334, 123.33452, 123.576567],
-                        [0.12334, 12.123, 123.45],
-                        0, 0.2344345, 0.34554654, 0.123343, 0.123343
-                    ]
-                ]
-
-test_tris = [
-                [0, 1, 2, 0]
-            ]
-
-
-#Thanks to Gaukler for these 3 functions
-def create_export_list(collection):
-    export_list = []
-
-    if(collection.hide_viewport):
-        return export_list
-
-    for object in collection.objects:
-        if(object.type == 'MESH' and object.hide_viewport == False):
-            export_list.append(object)
-            
-    for child in collection.children:
-                export_list.extend(create_export_list(child))
-
-    return export_list
-
-def clean_name(name):
-    # remove Blenders numbers at the end of names
-    if name[len(name) - 4:len(name) - 3] == ".":
-        cut = name[0:len(name) - 4]
-        return cut
-    else:
-        return name
-
-
-def get_export_armature(collection):
-    
-    if(collection.hide_viewport):
-        return None
-
-    for object in collection.objects:
-        if(object.type == 'ARMATURE' and object.hide_viewport == False):
-            return object
-            
-    for child in collection.children:
-        return get_export_armature(child)
-
-
-
-def write_indented(string, level):
-    return level * "\t" + string + "\n"   
-
-def write_labeled_int(label, value):
-    return label + " " + str(int(value))
-
-def write_labeled_string(label, value):
-    conv = lambda i : i or ''
-    return label + " " + '"' + conv(value) + '"'
-
-def write_labeled_hex(label, value):
-    return label + " " + str(value)
-
-def write_labeled_float(label, value):
-    return label + " " + "{:.6f}".format(value)
-
-def write_3list(list):
-    return ("[ " + "{:.6f}".format(list[0]) + " " 
-            + "{:.6f}".format(list[1]) + " " 
-            + "{:.6f}".format(list[2]) + " ]")
-
-def write_labeled_3list(label, list):
-    return label + " " + write_3list(list)
-
-def write_materials(diffuse_textures=[None], 
-                            self_illum_textures=[None], 
-                            normal_textures=[None], 
-                            disp_textures=[None], 
-                            tc_textures=[None], 
-                            diffuses=["ffffffff"], 
-                            ambients=["ffffffff"], 
-                            speculars=["ffffffff"], 
-                            emissives=["ffffffff"], 
-                            glosses=[50.0]):
-    """
-    Writes Materials to string
-    
-    Materials should have textures and values in lists where list index = material index
-    """
-                                
-    number_materials = len(diffuse_textures)                        
-    output = write_indented(write_labeled_int("NumMaterials", number_materials), 1)
-    
-    for i in range(number_materials):
-        print("Outputting material ", i+1)
-        diffuse_tex = write_labeled_string("DiffuseTextureFileName", diffuse_textures[i])
-        self_illum_tex = write_labeled_string("SelfIlluminationTextureFileName", self_illum_textures[i])
-        normal_tex = write_labeled_string("NormalTextureFileName", normal_textures[i])
-        disp_tex = write_labeled_string("DisplacementTextureFileName", disp_textures[i])
-        tc_tex = write_labeled_string("TeamColorTextureFileName", tc_textures[i])
-        diffuse = write_labeled_hex("Diffuse", diffuses[i])
-        ambient = write_labeled_hex("Ambient", ambients[i])
-        specular = write_labeled_hex("Specular", speculars[i])
-        emissive = write_labeled_hex("Emissive", emissives[i])
-        gloss =write_labeled_hex("Glossiness", glosses[i])
-        
-        output += write_indented("Material", 1)
-        output += write_indented(diffuse_tex, 2)
-        output += write_indented(self_illum_tex, 2)
-        output += write_indented(normal_tex, 2)
-        output += write_indented(disp_tex, 2)
-        output += write_indented(tc_tex, 2)
-        output += write_indented(diffuse, 2)
-        output += write_indented(ambient, 2)        
-        output += write_indented(specular, 2)
-        output += write_indented(emissive, 2)
-        output += write_indented(gloss, 2)
-        
-    return output
-
-def write_points(points):
-    """
-    Writes Points to string
-    
-    Points should be in format
-    
-    [[Name, Position [x, y, z], Orientation [x, y, z], [x, y, z], [x, y, z]]]
-    """
-    number_points = len(points)                        
-    output = write_indented(write_labeled_int("NumPoints", number_points), 1)
-    
-    print("Outputting ", number_points, " points")
-    
-    if number_points == 0:
-        return output
-    
-    for point in points:
-        datastring = write_labeled_string("DataString", point[0])
-        position = write_labeled_3list("Position", point[1])
-        orientation1 = " " + write_3list(point[2])
-        orientation2 = " " + write_3list(point[3])
-        orientation3 = " " + write_3list(point[4])
-        
-        output += write_indented("Point", 1)
-        output += write_indented(datastring, 2)
-        output += write_indented(position, 2)
-        output += write_indented("Orientation", 2)
-        output += write_indented(orientation1, 3)
-        output += write_indented(orientation2, 3)
-        output += write_indented(orientation3, 3)
-    
-    return output
-
-def write_vertices(vertices):
-    """
-    Writes verts to string
-    
-    Vertices should be in format
-    
-    [[Position [x, y, z], Normal [x, y, z], Tangent [x, y, z], Color, U0, V0, U1, V1]]
-    """
-    
-    number_verts = len(vertices)                        
-    output = write_indented(write_labeled_int("NumVertices", number_verts), 1)
-    
-    print("Outputting ", number_verts, " vertices")
-    
-    for vert in vertices:
-        position = write_labeled_3list("Position", vert[0])
-        normal = write_labeled_3list("Normal", vert[1])
-        tangent = write_labeled_3list("Tangent", vert[2])
-        color = write_labeled_int("Color", vert[3])
-        u0 = write_labeled_float("U0", vert[4])
-        v0 = write_labeled_float("V0", vert[5])
-        u1 = write_labeled_float("U1", vert[6])
-        v1 = write_labeled_float("V1", vert[7])
-        
-        output += write_indented("Vertex", 1)
-        output += write_indented(position, 2)
-        output += write_indented(normal, 2)
-        output += write_indented(tangent, 2)
-        output += write_indented(color, 2)
-        output += write_indented(u0, 2)
-        output += write_indented(v0, 2)
-        output += write_indented(u1, 2)
-        output += write_indented(v1, 2)
-    
-    return output
-    
-def write_triangles(triangles):
-    """
-    Writes faces to string
-    
-    Triangles should be in format
-    
-    [[vertex0, vertex1, vertex2, material index]]
-    """
-    number_tris = len(triangles)                        
-    output = write_indented(write_labeled_int("NumTriangles", number_tris), 1)
-    
-    print("Outputting ", number_tris, " triangles")
-    
-    for tri in triangles:
-        vert0 = write_labeled_int("iVertex0", tri[0])
-        vert1 = write_labeled_int("iVertex1", tri[1])
-        vert2 = write_labeled_int("iVertex2", tri[2])
-        mat = write_labeled_int("iMaterial", tri[3])
-        
-        output += write_indented("Triangle", 1)
-        output += write_indented(vert0, 2)
-        output += write_indented(vert1, 2)
-        output += write_indented(vert2, 2)
-        output += write_indented(mat, 2)
-    
-    return output
-    
-
-def write_mesh_data(context, filepath):
-    print("running write_mesh_data...")
-    
-    collection = bpy.context.scene.collection
-    
-    axis_convertor = bpy_extras.io_utils.axis_conversion(to_forward='Z', to_up='-Y')
-    
-    armature_object = get_export_armature(collection)
-    
-    if armature_object:
-        export_armature = armature_object.data
-    else:
-        export_armature = None
-    
-    mesh_list = create_export_list(collection)
-    
-    #Join mesh objects, DESTRUCTIVE
-    for object in mesh_list:
-        context.view_layer.objects.active = object
-        object.select_set(True)
-    
-    bpy.ops.object.join()
-    
-    #Setup mesh object
-    object = context.view_layer.objects.active
-    
-    depsgraph = context.evaluated_depsgraph_get()
-    object_eval = object.evaluated_get(depsgraph)
-    mesh = bpy.data.meshes.new_from_object(object_eval, preserve_all_data_layers=True, depsgraph=depsgraph)
-        
-    mesh.calc_tangents()
-    
-    #Create bmesh
-    bm = bmesh.new()
-    bm.from_mesh(mesh)
-    bm.verts.ensure_lookup_table()
-    bm.faces.ensure_lookup_table()
-  
-    bmesh.ops.split_edges(bm, edges=bm.edges)
-    bmesh.ops.triangulate(bm, faces=bm.faces)
-    
-    vertices = [None] * len(bm.verts)
-    triangles = [None] * len(bm.faces)
-    
-    bm.verts.index_update()
-    bm.faces.index_update()
-    
-    #Set up UV layers
-    uv_layer_0 = bm.loops.layers.uv[0]
-    
-    if len(bm.loops.layers.uv) > 1:
-        uv_layer_1 = bm.loops.layers.uv[1]
-    else:
-        uv_layer_1 = uv_layer_0
-    
-    #Set up triangle and vert lists
-    for face in bm.faces:
-        face_index = face.index
-        faceverts = [0] * 4
-        for i, loop in enumerate(face.loops):
-            vert = loop.vert
-            index = vert.index
-            faceverts[i] = index
-            vert_pos = vert.co @ axis_convertor
-            vert_normal = vert.normal @ axis_convertor
-            vert_tangent = copy.copy(mesh.loops[index].tangent @ axis_convertor)
-            vert_u0 = loop[uv_layer_0].uv.x
-            vert_v0 = 1 - loop[uv_layer_0].uv.y
-            vert_u1 = loop[uv_layer_1].uv.x
-            vert_v1 = 1 - loop[uv_layer_1].uv.y
-            vertices[index] = [vert_pos, 
-                        vert_normal, 
-                        vert_tangent, 
-                        0, 
-                        vert_u0, 
-                        vert_v0, 
-                        vert_u1, 
-                        vert_v1]
-        faceverts[3] = face.material_index
-        triangles[face_index] = faceverts
-    
-    if export_armature:
-        points = []
-        for bone in export_armature.bones:
-            name = bone.name
-            position = (bone.head_local @ axis_convertor).to_tuple()
-            orientation = bone.matrix_local.to_3x3() @ axis_convertor
-            points.append([name, position, orientation[0].to_tuple(), orientation[1].to_tuple(),orientation[2].to_tuple()])
-    else:
-        points = []
-    
-    print(points)
-    
-    #Bounding box calculations
-    bounding_box = object.bound_box
-    
-    summed_box = [xyz[0] + xyz[1] + xyz[2] for xyz in bounding_box]
-    summed_sq_box = [xyz[0]**2 + xyz[1]**2 + xyz[2]**2 for xyz in bounding_box]
-    
-    max_extent = max(summed_box)
-    min_extent = min(summed_box)
-    
-    max_ext_index = summed_box.index(max_extent)
-    min_ext_index = summed_box.index(min_extent)
-    
-    radius = math.sqrt(max(summed_sq_box))
-
-    #Creating giant string, top level
-    file_out = "TXT\nMeshData\n"
-    
-    #Header info
-    file_out += write_indented("maxDiffuseMipLevel 0", 1)
-    file_out += write_indented("hasValidTangents TRUE", 1)
-       
-    bounding_rad = write_labeled_float("BoundingRadius", radius)
-    max_bound = write_labeled_3list("MaxBoundingExtents", bounding_box[max_ext_index])
-    min_bound = write_labeled_3list("MinBoundingExtents", bounding_box[min_ext_index])
-    
-    file_out += write_indented(bounding_rad, 1)
-    file_out += write_indented(max_bound, 1)
-    file_out += write_indented(min_bound, 1)
-    
-    #Important stuff; materials, bones, verts, faces
-    file_out += write_materials()
-    
-    file_out += write_points(points)
-                                    
-    file_out += write_vertices(vertices)
-                            
-    file_out += write_triangles(triangles)                                
-    
-    #Cached verts
-    cached_up = write_labeled_int("NumCachedVertexIndicesInDirection:UP", 0)
-    cached_down = write_labeled_int("NumCachedVertexIndicesInDirection:DOWN", 0)
-    cached_left = write_labeled_int("NumCachedVertexIndicesInDirection:LEFT", 0)
-    cached_right = write_labeled_int("NumCachedVertexIndicesInDirection:RIGHT", 0)
-    cached_front = write_labeled_int("NumCachedVertexIndicesInDirection:FRONT", 0)
-    cached_back = write_labeled_int("NumCachedVertexIndicesInDirection:BACK", 0)
-    
-    file_out += write_indented(cached_up, 1)
-    file_out += write_indented(cached_down, 1)
-    file_out += write_indented(cached_left, 1)
-    file_out += write_indented(cached_right, 1)
-    file_out += write_indented(cached_front, 1)
-    file_out += write_indented(cached_back, 1)
-    
-    f = open(filepath, 'w', encoding='utf-8')
-    
-    f.write(file_out)
-    
-    f.close()
-    print("Export complete")
-    return {'FINISHED'}
-
-
-# ExportHelper is a helper class, defines filename and
-# invoke() function which calls the file selector.
-from bpy_extras.io_utils import ExportHelper
-from bpy.props import StringProperty, BoolProperty, EnumProperty
-from bpy.types import Operator
-
-
-class ExportMeshData(Operator, ExportHelper):
-    """This appears in the tooltip of the operator and in the generated docs"""
-    bl_idname = "export_test.mesh_data"  # important since its how bpy.ops.import_test.mesh_data is constructed
-    bl_label = "Export .mesh"
-
-    # ExportHelper mixin class uses this
-    filename_ext = ".mesh"
-
-    filter_glob: StringProperty(
-        default="*.mesh",
-        options={'HIDDEN'},
-        maxlen=255,  # Max internal buffer length, longer would be clamped.
-    )
-
-
-    def execute(self, context):
-        return write_mesh_data(context, self.filepath)
-
-
-# Only needed if you want to add into a dynamic menu
-def menu_func_export(self, context):
-    self.layout.operator(ExportMeshData.bl_idname, text="SOASE (.mesh)")
-
-
-def register():
-    bpy.utils.register_class(ExportMeshData)
-    bpy.types.TOPBAR_MT_file_export.append(menu_func_export)
-
-
-def unregister():
-    bpy.utils.unregister_class(ExportMeshData)
-    bpy.types.TOPBAR_MT_file_export.remove(menu_func_export)
-
-
-if __name__ == "__main__":
-    register()
-
-    # test call
-    bpy.ops.export_test.mesh_data('INVOKE_DEFAULT')
+import bpy
+import bpy_extras
+import os
+import threading
+import numpy as np
+
+from mesh_data import COLOR_ATTRIBUTE, TANGENT_ATTRIBUTE, TANGENT_SIGNATURE, MeshData, Material, Point, calc_bounds, calc_cached_indices, convert_mesh_axes, merge_meshes, transform_mesh, weld_vertices
+from mesh_cache import SectionCache, get_corner_signature
+from mesh_io import write_mesh_file
+from mesh_lod import DEFAULT_LOD_RATIOS, generate_lods
+from mesh_optimize import optimize_vertex_cache
+from mesh_timing import NO_TIMINGS, get_timings, logger
+
+#Thanks to Gaukler for these 3 functions
+def create_export_list(collection):
+    export_list = []
+
+    if(collection.hide_viewport):
+        return export_list
+
+    for object in collection.objects:
+        if(object.type == 'MESH' and object.hide_viewport == False):
+            export_list.append(object)
+            
+    for child in collection.children:
+                export_list.extend(create_export_list(child))
+
+    return export_list
+
+def clean_name(name):
+    # remove Blenders numbers at the end of names
+    if name[len(name) - 4:len(name) - 3] == ".":
+        cut = name[0:len(name) - 4]
+        return cut
+    else:
+        return name
+
+
+def get_export_armature(collection):
+    
+    if(collection.hide_viewport):
+        return None
+
+    for object in collection.objects:
+        if(object.type == 'ARMATURE' and object.hide_viewport == False):
+            return object
+            
+    for child in collection.children:
+        return get_export_armature(child)
+
+
+
+def get_array(collection, attribute, width, dtype=np.float32):
+    values = np.empty(len(collection) * width, dtype=dtype)
+    collection.foreach_get(attribute, values)
+    if width > 1:
+        values = values.reshape(-1, width)
+    return values
+
+def get_corner_attribute(mesh, name, data_type):
+    """
+    Returns the values of a face corner attribute as an array, or None if the mesh has no such attribute
+    """
+    attribute = mesh.attributes.get(name) if hasattr(mesh, "attributes") else None
+    if attribute is None or attribute.domain != 'CORNER' or attribute.data_type != data_type:
+        return None
+    if data_type == 'FLOAT_VECTOR':
+        return get_array(attribute.data, "vector", 3)
+    return get_array(attribute.data, "value", 1, np.int32)
+
+def get_mesh_material(name):
+    """
+    Returns the .mesh Material the importer stored on the Blender material called name, or the defaults
+    """
+    material = bpy.data.materials.get(name) if name else None
+    if material is None:
+        return Material()
+    return Material(**{field: material[field] for field in Material._fields if field in material})
+
+def extract_mesh_data(mesh, tangent_signature=None):
+    """
+    Extracts triangulated vertex and triangle arrays from a mesh with foreach_get
+    
+    Every face corner becomes its own vertex, so UV seams and hard edges are
+    kept, and triangles index corners through the mesh's loop triangles.
+    Tangents stored by the importer are only reused while the mesh still has
+    the corners, positions and UVs of tangent_signature, otherwise they are
+    recomputed.
+    """
+    mesh.calc_loop_triangles()
+    
+    vertex_indices = get_array(mesh.loops, "vertex_index", 1, np.int32)
+    co = get_array(mesh.vertices, "co", 3)
+    
+    if mesh.uv_layers:
+        uv0 = get_array(mesh.uv_layers[0].data, "uv", 2)
+    else:
+        uv0 = np.zeros((len(mesh.loops), 2), dtype=np.float32)
+    
+    #Tangents imported with the file are reused while the geometry and UVs
+    #are unchanged, edits and modifiers would have interpolated them
+    tangents = None
+    if tangent_signature is not None and get_corner_signature(vertex_indices, co, uv0) == tangent_signature:
+        tangents = get_corner_attribute(mesh, TANGENT_ATTRIBUTE, 'FLOAT_VECTOR')
+    
+    #Otherwise they need a UV map and parts without one get zero tangents
+    if tangents is None and mesh.uv_layers:
+        mesh.calc_tangents()
+        tangents = get_array(mesh.loops, "tangent", 3)
+    else:
+        #Newer Blender versions keep split normals up to date on their own
+        if hasattr(mesh, "calc_normals_split"):
+            mesh.calc_normals_split()
+        if tangents is None:
+            tangents = np.zeros((len(mesh.loops), 3), dtype=np.float32)
+    
+    colors = get_corner_attribute(mesh, COLOR_ATTRIBUTE, 'INT')
+    if colors is not None:
+        colors = colors.view(np.uint32)
+    
+    #Game UVs have V pointing down, without a second UV map it repeats the first
+    uv0[:, 1] = 1 - uv0[:, 1]
+    uv1 = None
+    if len(mesh.uv_layers) > 1:
+        uv1 = get_array(mesh.uv_layers[1].data, "uv", 2)
+        uv1[:, 1] = 1 - uv1[:, 1]
+    
+    return MeshData(positions=co[vertex_indices],
+                    normals=get_array(mesh.loops, "normal", 3),
+                    tangents=tangents,
+                    colors=colors,
+                    uv0=uv0,
+                    uv1=uv1,
+                    triangles=get_array(mesh.loop_triangles, "loops", 3, np.int32),
+                    material_ids=get_array(mesh.loop_triangles, "material_index", 1, np.int32))
+
+def extract_object_data(object, depsgraph, material_indices):
+    """
+    Extracts the evaluated mesh of one object in world space without touching the scene
+    
+    Slot material ids are remapped to indices in material_indices, a dict of
+    material name (None for empty slots) to shared index that grows as new
+    materials are found.
+    """
+    object_eval = object.evaluated_get(depsgraph)
+    mesh = object_eval.to_mesh(preserve_all_data_layers=True, depsgraph=depsgraph)
+    try:
+        mesh_data = extract_mesh_data(mesh, object.data.get(TANGENT_SIGNATURE))
+    finally:
+        object_eval.to_mesh_clear()
+    
+    transform_mesh(mesh_data, object.matrix_world)
+    
+    slot_names = [slot.material.name if slot.material else None for slot in object.material_slots] or [None]
+    remap = np.array([material_indices.setdefault(name, len(material_indices)) for name in slot_names], dtype=np.int32)
+    mesh_data.material_ids = remap[np.clip(mesh_data.material_ids, 0, len(remap) - 1)]
+    return mesh_data
+
+def get_lod_filepath(filepath, level):
+    base, extension = os.path.splitext(filepath)
+    return "{}_lod{}{}".format(base, level, extension)
+
+def gather_mesh_data(context, timings=NO_TIMINGS):
+    """
+    Extracts the visible meshes and the armature's bones into one MeshData in Blender axes
+    
+    This is the only part of an export that needs bpy, so it has to run on the
+    main thread. Returns None when there is nothing to export.
+    """
+    collection = context.scene.collection
+    
+    armature_object = get_export_armature(collection)
+    
+    if armature_object:
+        export_armature = armature_object.data
+    else:
+        export_armature = None
+    
+    mesh_list = create_export_list(collection)
+    
+    if not mesh_list:
+        return None
+    
+    #Evaluate every object on its own and merge the arrays, the scene is left untouched
+    with timings.stage("extract"):
+        depsgraph = context.evaluated_depsgraph_get()
+        material_indices = {}
+        parts = [extract_object_data(object, depsgraph, material_indices) for object in mesh_list]
+        
+        mesh_data = merge_meshes(parts, materials=[get_mesh_material(name) for name in material_indices])
+        
+        if export_armature:
+            #In world space like the mesh parts, so points follow a moved armature
+            points = []
+            for bone in export_armature.bones:
+                name = bone.name
+                matrix = armature_object.matrix_world @ bone.matrix_local
+                position = matrix.translation.to_tuple()
+                orientation = matrix.to_3x3().normalized()
+                points.append(Point(name, position, (orientation[0].to_tuple(), orientation[1].to_tuple(), orientation[2].to_tuple())))
+        else:
+            points = []
+        
+        logger.debug("Points: %s", points)
+        
+        mesh_data.points = points
+    timings.count("objects", len(mesh_list))
+    return mesh_data
+
+def get_axis_matrix():
+    """
+    Returns the Blender to game axis conversion as a NumPy array, usable off the main thread
+    """
+    return np.array(bpy_extras.io_utils.axis_conversion(to_forward='Z', to_up='-Y'), dtype=np.float32)
+
+def finish_mesh_data(mesh_data, filepath, axis_matrix, weld=True, weld_tolerance=1e-6, optimize_cache=False, lod_ratios=(), section_cache=None, timings=NO_TIMINGS, progress=None):
+    """
+    Converts, welds and optimises gathered MeshData and writes it and its LODs
+    
+    Does not use bpy, so it can run on a worker thread. progress, if given, is
+    called with the fraction of the work done, between stages and during the
+    long ones, and may raise to stop. Preparing the mesh, writing it and
+    decimating and writing each LOD count as equal steps. A SectionCache lets
+    the files reuse sections unchanged since the last export.
+    """
+    number_steps = 2 + 2 * len(lod_ratios)
+    
+    def step_progress(step, start=0.0, end=1.0):
+        if progress is None:
+            return None
+        return lambda fraction: progress((step + start + fraction * (end - start)) / number_steps)
+    
+    def report(step, fraction=0.0):
+        if progress is not None:
+            progress((step + fraction) / number_steps)
+    
+    #Convert everything to game axes in one batch
+    report(0)
+    with timings.stage("convert"):
+        convert_mesh_axes(mesh_data, axis_matrix)
+    report(0, 0.1)
+    
+    if weld:
+        number_verts = mesh_data.num_vertices
+        with timings.stage("weld"):
+            weld_vertices(mesh_data, weld_tolerance)
+        timings.count("welded_vertices", number_verts - mesh_data.num_vertices)
+    report(0, 0.4)
+    
+    if optimize_cache:
+        with timings.stage("optimise"):
+            acmr_before, acmr_after = optimize_vertex_cache(mesh_data, progress=step_progress(0, 0.4, 0.9))
+        logger.info("Vertex cache ACMR %.3f before, %.3f after", acmr_before, acmr_after)
+    report(0, 0.9)
+    
+    with timings.stage("bounds"):
+        calc_cached_indices(mesh_data)
+        
+        #Bounds from the final vertex positions
+        calc_bounds(mesh_data)
+    
+    timings.count("vertices", mesh_data.num_vertices)
+    timings.count("triangles", mesh_data.num_triangles)
+    
+    write_mesh_file(filepath, mesh_data, "TXT", timings, step_progress(1), section_cache)
+    
+    #Lower detail copies next to the main file, decimation needs welded vertices
+    if lod_ratios:
+        if not weld:
+            weld_vertices(mesh_data, weld_tolerance)
+        
+        #Decimating a level takes the first 80% of its step, optimising the rest
+        def lod_progress(index, fraction):
+            report(2 + 2 * index, 0.8 * fraction)
+        
+        for level, lod in enumerate(generate_lods(mesh_data, lod_ratios, lod_progress), 1):
+            with timings.stage("lod"):
+                if optimize_cache:
+                    optimize_vertex_cache(lod, progress=step_progress(2 * level, 0.8, 1.0))
+                calc_cached_indices(lod)
+                calc_bounds(lod)
+            logger.info("LOD %d has %d triangles", level, lod.num_triangles)
+            write_mesh_file(get_lod_filepath(filepath, level), lod, "TXT", timings, step_progress(2 * level + 1), section_cache)
+
+def write_mesh_data(context, filepath, weld=True, weld_tolerance=1e-6, optimize_cache=False, lod_ratios=(), section_cache=None):
+    logger.info("Exporting %s", filepath)
+    timings = get_timings("export " + os.path.basename(filepath))
+    
+    mesh_data = gather_mesh_data(context, timings)
+    if mesh_data is None:
+        logger.warning("No visible mesh objects to export")
+        return {'CANCELLED'}
+    
+    finish_mesh_data(mesh_data, filepath, get_axis_matrix(),
+                        weld=weld,
+                        weld_tolerance=weld_tolerance,
+                        optimize_cache=optimize_cache,
+                        lod_ratios=lod_ratios,
+                        section_cache=section_cache,
+                        timings=timings)
+    
+    timings.finish()
+    return {'FINISHED'}
+
+class ExportCancelled(Exception):
+    pass
+
+class BackgroundExport:
+    """
+    Runs finish_mesh_data on a worker thread
+    
+    progress holds the fraction of the export done so far. cancel() makes the
+    next progress report stop the export, between stages, during decimation
+    and Tipsify or while writing. A partly written file is removed and any
+    existing file is left as it was.
+    """
+
+    def __init__(self, mesh_data, filepath, axis_matrix, options, timings=NO_TIMINGS):
+        self.progress = 0.0
+        self.cancelled = False
+        self.error = None
+        self.cancel_event = threading.Event()
+        self.thread = threading.Thread(target=self.run,
+                                        args=(mesh_data, filepath, axis_matrix, options, timings),
+                                        daemon=True)
+        self.thread.start()
+
+    def report_progress(self, fraction):
+        if self.cancel_event.is_set():
+            raise ExportCancelled()
+        self.progress = fraction
+
+    def run(self, mesh_data, filepath, axis_matrix, options, timings):
+        try:
+            finish_mesh_data(mesh_data, filepath, axis_matrix, timings=timings, progress=self.report_progress, **options)
+        except ExportCancelled:
+            self.cancelled = True
+        except Exception as error:
+            #Handed back to the main thread to report
+            self.error = error
+
+    def cancel(self):
+        self.cancel_event.set()
+
+    def is_alive(self):
+        return self.thread.is_alive()
+
+
+# ExportHelper is a helper class, defines filename and
+# invoke() function which calls the file selector.
+from bpy_extras.io_utils import ExportHelper
+from bpy.props import StringProperty, BoolProperty, FloatProperty, FloatVectorProperty, IntProperty
+from bpy.types import Operator
+
+
+class ExportMeshData(Operator, ExportHelper):
+    """This appears in the tooltip of the operator and in the generated docs"""
+    bl_idname = "export_test.mesh_data"  # important since its how bpy.ops.import_test.mesh_data is constructed
+    bl_label = "Export .mesh"
+
+    # ExportHelper mixin class uses this
+    filename_ext = ".mesh"
+
+    filter_glob: StringProperty(
+        default="*.mesh",
+        options={'HIDDEN'},
+        maxlen=255,  # Max internal buffer length, longer would be clamped.
+    )
+
+    weld_vertices: BoolProperty(
+        name="Weld Vertices",
+        description="Merge vertices whose position, normal, tangent and UVs all match",
+        default=True,
+    )
+
+    weld_tolerance: FloatProperty(
+        name="Weld Tolerance",
+        description="Largest difference between attribute values that still counts as a match",
+        default=1e-6,
+        min=0.0,
+        precision=6,
+    )
+
+    optimize_vertex_cache: BoolProperty(
+        name="Optimize Vertex Cache",
+        description="Reorder triangles and vertices for GPU cache reuse, most effective with welded vertices",
+        default=False,
+    )
+
+    lod_count: IntProperty(
+        name="LOD Levels",
+        description="Also write this many decimated copies as <name>_lod<N>.mesh",
+        default=0,
+        min=0,
+        max=len(DEFAULT_LOD_RATIOS),
+    )
+
+    lod_ratios: FloatVectorProperty(
+        name="LOD Ratios",
+        description="Fraction of the triangles kept by each LOD level",
+        size=len(DEFAULT_LOD_RATIOS),
+        default=DEFAULT_LOD_RATIOS,
+        min=0.01,
+        max=1.0,
+    )
+
+    reuse_sections: BoolProperty(
+        name="Reuse Unchanged Sections",
+        description="Copy text sections that did not change since the last export to this file from a cache instead of formatting them again",
+        default=True,
+    )
+
+    run_in_background: BoolProperty(
+        name="Run in Background",
+        description="Write the file on a worker thread so Blender stays usable, Esc cancels",
+        default=True,
+    )
+
+    def get_options(self):
+        return {
+            "weld": self.weld_vertices,
+            "weld_tolerance": self.weld_tolerance,
+            "optimize_cache": self.optimize_vertex_cache,
+            "lod_ratios": tuple(self.lod_ratios)[:self.lod_count],
+            "section_cache": SectionCache() if self.reuse_sections else None,
+        }
+
+    def execute(self, context):
+        if not self.run_in_background or context.window is None:
+            return write_mesh_data(context, self.filepath, **self.get_options())
+        
+        #Only gathering the arrays needs the main thread
+        logger.info("Exporting %s", self.filepath)
+        self.timings = get_timings("export " + os.path.basename(self.filepath))
+        mesh_data = gather_mesh_data(context, self.timings)
+        if mesh_data is None:
+            self.report({'WARNING'}, "No visible mesh objects to export")
+            return {'CANCELLED'}
+        
+        self.job = BackgroundExport(mesh_data, self.filepath, get_axis_matrix(), self.get_options(), self.timings)
+        
+        window_manager = context.window_manager
+        self.timer = window_manager.event_timer_add(0.1, window=context.window)
+        window_manager.progress_begin(0, 100)
+        window_manager.modal_handler_add(self)
+        return {'RUNNING_MODAL'}
+
+    def modal(self, context, event):
+        if event.type == 'ESC' and event.value == 'PRESS':
+            self.job.cancel()
+            return {'RUNNING_MODAL'}
+        
+        if event.type != 'TIMER':
+            return {'PASS_THROUGH'}
+        
+        if self.job.is_alive():
+            percent = int(self.job.progress * 100)
+            context.window_manager.progress_update(percent)
+            context.workspace.status_text_set("Exporting {}: {}% (Esc to cancel)".format(os.path.basename(self.filepath), percent))
+            return {'PASS_THROUGH'}
+        
+        window_manager = context.window_manager
+        window_manager.event_timer_remove(self.timer)
+        window_manager.progress_end()
+        context.workspace.status_text_set(None)
+        
+        if self.job.cancelled:
+            self.report({'WARNING'}, "Export cancelled")
+            return {'CANCELLED'}
+        if self.job.error is not None:
+            self.report({'ERROR'}, "Export failed: {}".format(self.job.error))
+            return {'CANCELLED'}
+        
+        self.timings.finish()
+        self.report({'INFO'}, "Exported " + self.filepath)
+        return {'FINISHED'}
+
+
+# Only needed if you want to add into a dynamic menu
+def menu_func_export(self, context):
+    self.layout.operator(ExportMeshData.bl_idname, text="SOASE (.mesh)")
+
+
+def register():
+    bpy.utils.register_class(ExportMeshData)
+    bpy.types.TOPBAR_MT_file_export.append(menu_func_export)
+
+
+def unregister():
+    bpy.utils.unregister_class(ExportMeshData)
+    bpy.types.TOPBAR_MT_file_export.remove(menu_func_export)
+
+
+if __name__ == "__main__":
+    register()
+
+    # test call
+    bpy.ops.export_test.mesh_data('INVOKE_DEFAULT')
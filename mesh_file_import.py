@@ -1,251 +1,519 @@
-import bpy
-import bmesh
-import mathutils
-import os
-import math
-import bpy_extras
-
-class Node:
-    def __init__(self, indented_line):
-        self.children = []
-        self.level = len(indented_line) - len(indented_line.lstrip())
-        self.text = indented_line.strip()
-
-    def add_children(self, nodes):
-        childlevel = nodes[0].level
-        while nodes:
-            node = nodes.pop(0)
-            if node.level == childlevel: # add node as a child
-                self.children.append(node)
-            elif node.level > childlevel: # add nodes as grandchildren of the last child
-                nodes.insert(0,node)
-                self.children[-1].add_children(nodes)
-            elif node.level <= self.level: # this node is a sibling, no more children
-                nodes.insert(0,node)
-                return
-
-    def as_dict(self):
-        if len(self.children) > 1:
-            return {self.text: [node.as_dict() for node in self.children]}
-        elif len(self.children) == 1:
-            return {self.text: self.children[0].as_dict()}
-        else:
-            return self.text
-
-def get_total(type_name, entry):
-    total = 0
-    if type_name in entry:
-        total = int(entry.split()[1])
-        print(type_name+": ", total)
-        return total
-
-def get_float_value(entry):
-    return float(entry.split()[1])
-
-def get_string_value(entry):
-    return str(entry.split()[1])
-
-def get_int_value(entry):
-    return int(entry.split()[1])
-
-def get_3list_value(entry):
-    list = entry.split()
-    x = float(list[2])
-    y = float(list[3])
-    z = float(list[4])
-    return (x, y, z)
-
-def get_3list_value_unnamed(entry):
-    list = entry.split()
-    x = float(list[1])
-    y = float(list[2])
-    z = float(list[3])
-    return (x, y, z)
-
-def create_mesh(ob_name, coords, edges=[], faces=[]):
-    """Create point cloud object based on given coordinates and name.
-
-    Keyword arguments:
-    ob_name -- new object name
-    coords -- float triplets eg: [(-1.0, 1.0, 0.0), (-1.0, -1.0, 0.0)]
-    """
-
-    # Create new mesh and a new object
-    me = bpy.data.meshes.new(ob_name + "Mesh")
-    ob = bpy.data.objects.new(ob_name, me)
-
-    # Make a mesh from a list of vertices/edges/faces
-    me.from_pydata(coords, edges, faces)
-
-    # Display name and update the mesh
-    ob.show_name = True
-    me.update(calc_edges=True)
-    return ob
-
-def read_mesh_data(context, filepath):
-    print("running...")
-    f = open(filepath, 'r', encoding='utf-8')
-    mesh = f.read()
-    f.close()
-    
-    model_name = os.path.basename(filepath)[:-5]
-    
-    root = Node('root')
-    
-    root.add_children([Node(line) for line in mesh.splitlines() if line.strip()])
-    d = root.as_dict()['root']
-    
-    bpy.ops.object.armature_add(radius=0) 
-    skeleton = bpy.data.objects['Armature']
-    skeleton.name = model_name + " skeleton"
-    bpy.context.view_layer.objects.active = skeleton
-    
-    bpy.ops.object.editmode_toggle()
-    
-    edit_bones = skeleton.data.edit_bones
-    
-    axis_convertor = bpy_extras.io_utils.axis_conversion(from_forward='Z', from_up='-Y')
-    
-    #Loop data
-    for key, value in d[1].items():
-        verts = []
-        triangles = []
-        face_materials = []
-        uv0 = []
-        uv1= []
-        
-        #Loop data entries
-        for index, entry in enumerate(value):
-            #Get total counts, may be useful
-            total_materials = get_total("NumMaterials", entry)
-            total_bones = get_total("NumPoints", entry)
-            total_verts = get_total("NumVertices", entry)
-            total_tris = get_total("NumTriangles", entry)
-
-            #getting data from dict type entries
-            if type(entry) is dict:
-                try:
-                    bone = entry["Point"]
-                    name = get_string_value(bone[0])
-                    position = mathutils.Vector(get_3list_value(bone[1])) @ axis_convertor
-                    b = edit_bones.new(name.strip('"'))
-                    b.tail = (0, 10, 0)
-                    direction = bone[2]["Orientation"]
-                    x = get_3list_value_unnamed(direction[0]) + (position[0], )
-                    y = get_3list_value_unnamed(direction[1]) + (position[1], )
-                    z = get_3list_value_unnamed(direction[2]) + (position[2], )
-                    last_row = (0, 0, 0, 1)
-                    bone_matrix = mathutils.Matrix((x, y, z, last_row)) @ axis_convertor.to_4x4()
-                    b.matrix = bone_matrix
-                except KeyError:
-                    pass    
-                  
-                try:
-                    vertex = entry["Vertex"]
-                    vertex_transformed = mathutils.Vector(get_3list_value(vertex[0])) @ axis_convertor
-                    verts.append(vertex_transformed)   
-                    uv0.append([get_float_value(vertex[4]), get_float_value(vertex[5])])
-                    uv1.append([get_float_value(vertex[6]), get_float_value(vertex[7])])
-                except KeyError:
-                    pass
-                
-                try:
-                    tri = entry["Triangle"]
-                    triangles.append([get_int_value(tri[0]), get_int_value(tri[1]),  get_int_value(tri[2])])
-                    face_materials.append(get_int_value(tri[3]))
-                except KeyError:
-                    pass
-    
-    bpy.ops.object.editmode_toggle()
-    
-    name = model_name
-    obj = create_mesh(name, verts, faces=triangles)
-    
-    bpy.context.collection.objects.link(obj)
-    obj.select_set(True)  
-    bpy.context.view_layer.objects.active = obj
-        
-    bpy.ops.object.editmode_toggle()
-    mesh = bmesh.from_edit_mesh(bpy.context.edit_object.data)
-    
-    #Set UVs
-    uv_layer = mesh.loops.layers.uv.verify()
-
-    for f in mesh.faces:
-        for l in f.loops:
-            i = l.vert.index
-            loop_uv = l[uv_layer]
-            loop_uv.uv = (uv0[i][0], 1 - uv0[i][1])
-        
-    
-    bmesh.ops.remove_doubles(mesh, verts=mesh.verts, dist=0.0001)
-    bpy.ops.object.editmode_toggle()
-    
-    print("Import complete")
-
-    return {'FINISHED'}
-
-
-# ImportHelper is a helper class, defines filename and
-# invoke() function which calls the file selector.
-from bpy_extras.io_utils import ImportHelper
-from bpy.props import StringProperty, BoolProperty, EnumProperty
-from bpy.types import Operator
-
-
-class ImportMeshData(Operator, ImportHelper):
-    """This appears in the tooltip of the operator and in the generated docs"""
-    bl_idname = "import_mesh.mesh_data"  # important since its how bpy.ops.import_test.some_data is constructed
-    bl_label = "Import .mesh file"
-
-    # ImportHelper mixin class uses this
-    filename_ext = ".mesh"
-
-    filter_glob: StringProperty(
-        default="*.mesh",
-        options={'HIDDEN'},
-        maxlen=255,  # Max internal buffer length, longer would be clamped.
-    )
-
-    # List of operator properties, the attributes will be assigned
-    # to the class instance from the operator settings before calling.
-    #use_setting: BoolProperty(
-    #    name="Example Boolean",
-    #    description="Example Tooltip",
-    #    default=True,
-    #)
-
-    #type: EnumProperty(
-    #    name="Example Enum",
-    #    description="Choose between two items",
-    #    items=(
-     #       ('OPT_A', "First Option", "Description one"),
-    #        ('OPT_B', "Second Option", "Description two"),
-     #   ),
-    #    default='OPT_A',
-    #)
-
-    def execute(self, context):
-        return read_mesh_data(context, self.filepath)
-
-
-# Only needed if you want to add into a dynamic menu
-def menu_func_import(self, context):
-    self.layout.operator(ImportMeshData.bl_idname, text="SOASE (.mesh)")
-
-
-def register():
-    bpy.utils.register_class(ImportMeshData)
-    bpy.types.TOPBAR_MT_file_import.append(menu_func_import)
-
-
-def unregister():
-    bpy.utils.unregister_class(ImportMeshData)
-    bpy.types.TOPBAR_MT_file_import.remove(menu_func_import)
-
-
-if __name__ == "__main__":
-    register()
-
-    # test call
-    bpy.ops.import_mesh.mesh_data('INVOKE_DEFAULT')
+import bpy
+import mathutils
+import os
+import sys
+import math
+import bpy_extras
+import numpy as np
+
+from mesh_data import COLOR_ATTRIBUTE, TANGENT_ATTRIBUTE, TANGENT_SIGNATURE, Material, convert_mesh_axes, weld_positions
+from mesh_binary import EXTENSION as BINARY_EXTENSION
+from mesh_cache import ParseCache, get_corner_signature
+from mesh_io import READ_ERRORS, read_mesh_file, read_mesh_files
+from mesh_timing import NO_TIMINGS, get_timings, logger
+from mesh_watch import WatchedFile
+
+def set_corner_attribute(me, name, data_type, values):
+    """Store one value per face corner in a generic attribute, skipped before Blender 2.91"""
+    if not hasattr(me, "attributes"):
+        return None
+    attribute = me.attributes.get(name)
+    if attribute is None:
+        attribute = me.attributes.new(name, data_type, 'CORNER')
+    attribute.data.foreach_set("vector" if data_type == 'FLOAT_VECTOR' else "value", np.ascontiguousarray(values).ravel())
+    return attribute
+
+def get_blender_material(material, name):
+    """Returns a Blender material holding the .mesh material's fields as custom properties
+    
+    An existing material of that name is reused when its fields all match, so
+    importing a file again does not duplicate its materials.
+    """
+    existing = bpy.data.materials.get(name)
+    if existing is not None and all(existing.get(field) == value for field, value in zip(Material._fields, material)):
+        return existing
+    
+    blender_material = bpy.data.materials.new(name)
+    for field, value in zip(Material._fields, material):
+        blender_material[field] = value
+    return blender_material
+
+def get_blender_materials(materials, model_name):
+    """Returns a Blender material per .mesh material, named after its diffuse texture"""
+    return [get_blender_material(material, os.path.splitext(os.path.basename(material.diffuse_texture))[0]
+                                    or "{} material {}".format(model_name, index))
+            for index, material in enumerate(materials)]
+
+def get_corner_arrays(mesh_data, timings=NO_TIMINGS):
+    """Returns the arrays a Blender mesh is built from as a dict, converting mesh_data to Blender axes in place.
+    
+    Positions are welded and triangles welding made degenerate are dropped,
+    every other vertex attribute is given per remaining triangle corner.
+    """
+    #Convert everything to Blender axes in one batch
+    with timings.stage("convert"):
+        axis_convertor = bpy_extras.io_utils.axis_conversion(from_forward='Z', from_up='-Y')
+        convert_mesh_axes(mesh_data, axis_convertor)
+    
+    #Merge doubles on the arrays, everything else stays per corner so seams and hard edges are kept
+    with timings.stage("weld"):
+        keep, remap = weld_positions(mesh_data.positions, 0.0001)
+        triangles = remap[mesh_data.triangles]
+        valid = ((triangles[:, 0] != triangles[:, 1])
+                    & (triangles[:, 1] != triangles[:, 2])
+                    & (triangles[:, 0] != triangles[:, 2]))
+    timings.count("welded_vertices", mesh_data.num_vertices - len(keep))
+    
+    #Vertex attributes per remaining triangle corner, V flipped for Blender
+    with timings.stage("corners"):
+        corners = mesh_data.triangles[valid].ravel()
+        loop_uvs = mesh_data.uv0[corners]
+        loop_uvs[:, 1] = 1 - loop_uvs[:, 1]
+        return {
+            "positions": mesh_data.positions[keep],
+            "triangles": triangles[valid].astype(np.int32),
+            "material_ids": np.clip(mesh_data.material_ids[valid], 0, max(len(mesh_data.materials) - 1, 0)),
+            "uvs": loop_uvs,
+            "normals": mesh_data.normals[corners],
+            "tangents": mesh_data.tangents[corners],
+            "colors": mesh_data.colors[corners].view(np.int32),
+        }
+
+def store_tangents(me, arrays):
+    """Keep the file's tangents for the exporter with the signature of the corners they belong to"""
+    if set_corner_attribute(me, TANGENT_ATTRIBUTE, 'FLOAT_VECTOR', arrays["tangents"]) is not None:
+        me[TANGENT_SIGNATURE] = get_corner_signature(arrays["triangles"].ravel(), arrays["positions"], arrays["uvs"])
+
+def set_custom_normals(me, loop_normals):
+    """Set one custom split normal per face corner"""
+    # Custom normals only show on smooth faces, and before Blender 4.1 with auto smooth on
+    me.polygons.foreach_set("use_smooth", np.ones(len(me.polygons), dtype=bool))
+    if hasattr(me, "use_auto_smooth"):
+        me.use_auto_smooth = True
+    me.normals_split_custom_set(np.ascontiguousarray(loop_normals, dtype=np.float32))
+
+def fill_mesh(me, arrays):
+    """Build the geometry of an empty mesh from get_corner_arrays in bulk.
+    
+    Tangents and colors are kept in face corner attributes for the exporter,
+    so a round trip writes the file's own values.
+    """
+    positions = arrays["positions"]
+    triangles = arrays["triangles"]
+
+    number_tris = len(triangles)
+    me.vertices.add(len(positions))
+    me.loops.add(number_tris * 3)
+    me.polygons.add(number_tris)
+
+    # Fill the mesh straight from the arrays
+    me.vertices.foreach_set("co", np.ascontiguousarray(positions, dtype=np.float32).ravel())
+    me.loops.foreach_set("vertex_index", np.ascontiguousarray(triangles, dtype=np.int32).ravel())
+    me.polygons.foreach_set("loop_start", np.arange(0, number_tris * 3, 3, dtype=np.int32))
+    # loop_total is derived from loop_start and read-only in newer Blender versions
+    if not me.polygons.bl_rna.properties["loop_total"].is_readonly:
+        me.polygons.foreach_set("loop_total", np.full(number_tris, 3, dtype=np.int32))
+
+    me.polygons.foreach_set("material_index", np.ascontiguousarray(arrays["material_ids"], dtype=np.int32))
+
+    uv_layer = me.uv_layers[0] if me.uv_layers else me.uv_layers.new()
+    uv_layer.data.foreach_set("uv", np.ascontiguousarray(arrays["uvs"], dtype=np.float32).ravel())
+
+    me.update(calc_edges=True)
+    set_custom_normals(me, arrays["normals"])
+    store_tangents(me, arrays)
+    set_corner_attribute(me, COLOR_ATTRIBUTE, 'INT', arrays["colors"])
+
+def create_mesh(ob_name, arrays, materials=()):
+    """Create mesh object from flat arrays in bulk.
+
+    Keyword arguments:
+    ob_name -- new object name
+    arrays -- dict of arrays from get_corner_arrays
+    materials -- Blender materials for the slots the material ids index
+    """
+
+    # Create new mesh and a new object
+    me = bpy.data.meshes.new(ob_name + "Mesh")
+    ob = bpy.data.objects.new(ob_name, me)
+
+    for material in materials:
+        me.materials.append(material)
+    fill_mesh(me, arrays)
+
+    # Display name
+    ob.show_name = True
+    return ob
+
+def update_mesh(me, arrays, changed):
+    """Write the arrays of the changed .mesh sections into an existing mesh in place.
+    
+    The geometry is only rebuilt when the welded vertices or triangles no
+    longer match the mesh's. Returns True if it was rebuilt.
+    
+    Every per corner array is gathered through the triangles, so when they
+    changed the UVs, normals, tangents and colors are all written again even
+    if the welded topology stayed the same, as when a triangle switches to
+    another copy of a vertex on a UV seam.
+    """
+    positions = arrays["positions"]
+    triangles = arrays["triangles"]
+    
+    same_topology = len(me.vertices) == len(positions) and len(me.loops) == triangles.size
+    if same_topology:
+        vertex_indices = np.empty(len(me.loops), dtype=np.int32)
+        me.loops.foreach_get("vertex_index", vertex_indices)
+        same_topology = np.array_equal(vertex_indices, triangles.ravel())
+    
+    if not same_topology:
+        me.clear_geometry()
+        fill_mesh(me, arrays)
+        return True
+    
+    if "triangles" in changed:
+        changed = changed | {"uv0", "normals", "tangents", "colors"}
+    if "positions" in changed:
+        me.vertices.foreach_set("co", np.ascontiguousarray(positions, dtype=np.float32).ravel())
+    if changed & {"material_ids", "materials"}:
+        me.polygons.foreach_set("material_index", np.ascontiguousarray(arrays["material_ids"], dtype=np.int32))
+    if "uv0" in changed:
+        uv_layer = me.uv_layers[0] if me.uv_layers else me.uv_layers.new()
+        uv_layer.data.foreach_set("uv", np.ascontiguousarray(arrays["uvs"], dtype=np.float32).ravel())
+    if changed & {"tangents", "positions", "uv0"}:
+        store_tangents(me, arrays)
+    if "colors" in changed:
+        set_corner_attribute(me, COLOR_ATTRIBUTE, 'INT', arrays["colors"])
+    me.update()
+    
+    # Custom normals are stored relative to the faces, so moved vertices need them set again
+    if changed & {"positions", "normals"}:
+        set_custom_normals(me, arrays["normals"])
+    return False
+
+def set_bone_matrices(edit_bones, points):
+    """Create or move a bone for each point, matching bones by name"""
+    for point in points:
+        b = edit_bones.get(point.name)
+        if b is None:
+            b = edit_bones.new(point.name)
+        b.tail = (0, 10, 0)
+        x = point.orientation[0] + (point.position[0], )
+        y = point.orientation[1] + (point.position[1], )
+        z = point.orientation[2] + (point.position[2], )
+        last_row = (0, 0, 0, 1)
+        b.matrix = mathutils.Matrix((x, y, z, last_row))
+
+def create_skeleton(context, name, points):
+    """Create an armature object with a bone for each point."""
+    bpy.ops.object.armature_add(radius=0) 
+    skeleton = context.view_layer.objects.active
+    skeleton.name = name
+    
+    bpy.ops.object.editmode_toggle()
+    set_bone_matrices(skeleton.data.edit_bones, points)
+    bpy.ops.object.editmode_toggle()
+    return skeleton
+
+def update_skeleton(context, skeleton, points, old_names=()):
+    """Move the bones of an existing skeleton to points in place.
+    
+    Bones for points named in old_names that are gone are removed, other
+    bones are left alone.
+    """
+    view_layer = context.view_layer
+    active = view_layer.objects.active
+    view_layer.objects.active = skeleton
+    bpy.ops.object.mode_set(mode='EDIT')
+    
+    edit_bones = skeleton.data.edit_bones
+    names = {point.name for point in points}
+    for name in old_names:
+        bone = edit_bones.get(name)
+        if bone is not None and name not in names:
+            edit_bones.remove(bone)
+    set_bone_matrices(edit_bones, points)
+    
+    bpy.ops.object.mode_set(mode='OBJECT')
+    view_layer.objects.active = active
+
+def create_mesh_objects(context, mesh_data, model_name, timings=NO_TIMINGS):
+    """Create the skeleton and mesh objects for parsed MeshData, returns both."""
+    timings.count("materials", len(mesh_data.materials))
+    timings.count("points", len(mesh_data.points))
+    timings.count("vertices", mesh_data.num_vertices)
+    timings.count("triangles", mesh_data.num_triangles)
+    
+    arrays = get_corner_arrays(mesh_data, timings)
+    
+    with timings.stage("build"):
+        skeleton = create_skeleton(context, model_name + " skeleton", mesh_data.points)
+        obj = create_mesh(model_name, arrays, get_blender_materials(mesh_data.materials, model_name))
+        
+        context.collection.objects.link(obj)
+        obj.select_set(True)  
+        context.view_layer.objects.active = obj
+    
+    return skeleton, obj
+
+def get_model_name(filepath):
+    return os.path.splitext(os.path.basename(filepath))[0]
+
+def read_mesh_data(context, filepath, cache=None, watch=False):
+    logger.info("Importing %s", filepath)
+    timings = get_timings("import " + os.path.basename(filepath))
+    
+    watched = WatchedFile(os.path.abspath(filepath)) if watch else None
+    mesh_data = read_mesh_file(filepath, cache, timings)
+    #Hashed before the objects are built, which converts the arrays in place
+    if watched:
+        watched.update(mesh_data)
+    skeleton, obj = create_mesh_objects(context, mesh_data, get_model_name(filepath), timings)
+    if watched:
+        start_watching(watched, skeleton, obj)
+    
+    timings.finish()
+    return {'FINISHED'}
+
+def read_many_mesh_data(context, filepaths, cache=None, watch=False, report=None):
+    """
+    Imports several .mesh files, parsing them in parallel worker processes
+    
+    Only the object creation runs on Blender's main thread, one file at a time
+    as the workers finish. Time spent waiting for the workers is the "read" stage.
+    Files that cannot be read are skipped and logged, and passed to report, an
+    operator's report method, if given.
+    """
+    logger.info("Importing %d files", len(filepaths))
+    timings = get_timings("import {} files".format(len(filepaths)))
+    
+    #Blender before 2.91 reports itself as sys.executable
+    executable = getattr(bpy.app, "binary_path_python", sys.executable)
+    
+    results = read_mesh_files(filepaths, executable=executable, cache=cache)
+    failed = []
+    while True:
+        with timings.stage("read"):
+            result = next(results, None)
+        if result is None:
+            break
+        filepath, mesh_data, error = result
+        if error is not None:
+            failed.append(filepath)
+            logger.warning("Could not read %s: %s", filepath, error)
+            if report:
+                report({'WARNING'}, "Could not read {}: {}".format(filepath, error))
+            continue
+        logger.debug("Building %s", filepath)
+        watched = WatchedFile(os.path.abspath(filepath)) if watch else None
+        if watched:
+            watched.update(mesh_data)
+        skeleton, obj = create_mesh_objects(context, mesh_data, get_model_name(filepath), timings)
+        if watched:
+            start_watching(watched, skeleton, obj)
+    
+    timings.count("failed", len(failed))
+    timings.finish()
+    if failed and report:
+        report({'WARNING'}, "Imported {} of {} files, see the console for the ones that failed".format(
+            len(filepaths) - len(failed), len(filepaths)))
+    return {'FINISHED'}
+
+#Imported files reloaded in place when they change, by absolute path
+watched_files = {}
+
+#Seconds between checks of the watched files
+WATCH_INTERVAL = 0.25
+
+def start_watching(watched, skeleton, obj):
+    watched.object_name = obj.name
+    watched.skeleton_name = skeleton.name
+    watched_files[watched.filepath] = watched
+    if not bpy.app.timers.is_registered(watch_timer):
+        bpy.app.timers.register(watch_timer, first_interval=WATCH_INTERVAL)
+
+def stop_watching(filepath=None):
+    """
+    Stops watching filepath, or every file when it is None
+    """
+    if filepath is None:
+        watched_files.clear()
+    else:
+        watched_files.pop(os.path.abspath(filepath), None)
+
+def reload_mesh_objects(context, watched, obj, skeleton, mesh_data, timings=NO_TIMINGS):
+    """
+    Writes a newly read MeshData into the objects a watched file was imported as, in place
+    
+    Only sections whose data changed since the last load are written, the
+    geometry is only rebuilt when the welded topology changed.
+    """
+    old_point_names = watched.point_names
+    changed = watched.update(mesh_data)
+    timings.count("changed_sections", len(changed))
+    if not changed:
+        return changed
+    
+    arrays = get_corner_arrays(mesh_data, timings)
+    
+    with timings.stage("build"):
+        me = obj.data
+        if "materials" in changed:
+            me.materials.clear()
+            for material in get_blender_materials(mesh_data.materials, get_model_name(watched.filepath)):
+                me.materials.append(material)
+        
+        if update_mesh(me, arrays, changed):
+            timings.count("rebuilt", 1)
+        
+        if "points" in changed and skeleton is not None:
+            try:
+                update_skeleton(context, skeleton, mesh_data.points, old_point_names)
+            except RuntimeError as error:
+                logger.warning("Could not move the bones of %s: %s", skeleton.name, error)
+    return changed
+
+def reload_watched_files(context=None):
+    """
+    Reloads every watched file that changed on disk into its objects, returns the reloaded paths
+    
+    The watch timer calls this, a script generating .mesh files can also call
+    it right after writing one to update the scene straight away. Files whose
+    object was deleted stop being watched, objects in edit mode are reloaded
+    once they leave it.
+    """
+    context = context or bpy.context
+    reloaded = []
+    for filepath, watched in list(watched_files.items()):
+        obj = bpy.data.objects.get(watched.object_name)
+        if obj is None or obj.type != 'MESH':
+            logger.info("Stopped watching %s, its object is gone", filepath)
+            del watched_files[filepath]
+            continue
+        skeleton = bpy.data.objects.get(watched.skeleton_name)
+        if obj.mode == 'EDIT' or (skeleton is not None and skeleton.mode == 'EDIT'):
+            continue
+        if not watched.poll():
+            continue
+        
+        timings = get_timings("reload " + os.path.basename(filepath))
+        try:
+            mesh_data = read_mesh_file(filepath, timings=timings)
+        except READ_ERRORS as error:
+            #Usually a file caught halfway through being written, it is read again on its next change
+            logger.warning("Could not reload %s: %s", filepath, error)
+            continue
+        changed = reload_mesh_objects(context, watched, obj, skeleton, mesh_data, timings)
+        logger.debug("Reloaded %s, changed %s", filepath, sorted(changed))
+        timings.finish()
+        reloaded.append(filepath)
+    return reloaded
+
+def watch_timer():
+    reload_watched_files()
+    if not watched_files:
+        return None
+    return WATCH_INTERVAL
+
+
+# ImportHelper is a helper class, defines filename and
+# invoke() function which calls the file selector.
+from bpy_extras.io_utils import ImportHelper
+from bpy.props import StringProperty, BoolProperty, EnumProperty, CollectionProperty
+from bpy.types import Operator, OperatorFileListElement
+
+
+class ImportMeshData(Operator, ImportHelper):
+    """Import a SOASE text .mesh file or the add-on's .meshbin form of one, the format is detected from the file"""
+    bl_idname = "import_mesh.mesh_data"  # important since its how bpy.ops.import_test.some_data is constructed
+    bl_label = "Import .mesh file"
+
+    # ImportHelper mixin class uses this
+    filename_ext = ".mesh"
+
+    filter_glob: StringProperty(
+        default="*.mesh;*" + BINARY_EXTENSION,
+        options={'HIDDEN'},
+        maxlen=255,  # Max internal buffer length, longer would be clamped.
+    )
+
+    # Multi-select in the file browser fills these
+    files: CollectionProperty(
+        type=OperatorFileListElement,
+        options={'HIDDEN', 'SKIP_SAVE'},
+    )
+
+    directory: StringProperty(
+        subtype='DIR_PATH',
+        options={'HIDDEN', 'SKIP_SAVE'},
+    )
+
+    import_directory: BoolProperty(
+        name="Whole Directory",
+        description="Import every .mesh file in the selected directory",
+        default=False,
+    )
+
+    use_cache: BoolProperty(
+        name="Use Parse Cache",
+        description="Load unchanged text files from the parsed mesh cache in the user cache directory",
+        default=True,
+    )
+
+    watch: BoolProperty(
+        name="Watch for Changes",
+        description="Reload the imported meshes and points in place whenever their files change on disk",
+        default=False,
+    )
+
+    def get_filepaths(self):
+        if self.import_directory and self.directory:
+            return sorted(os.path.join(self.directory, name)
+                            for name in os.listdir(self.directory)
+                            if name.lower().endswith((".mesh", BINARY_EXTENSION)))
+        
+        filepaths = [os.path.join(self.directory, file.name) for file in self.files if file.name]
+        return filepaths or [self.filepath]
+
+    def execute(self, context):
+        filepaths = self.get_filepaths()
+        cache = ParseCache() if self.use_cache else None
+        if len(filepaths) == 1:
+            return read_mesh_data(context, filepaths[0], cache, self.watch)
+        return read_many_mesh_data(context, filepaths, cache, self.watch, self.report)
+
+
+class StopWatchingMeshData(Operator):
+    """Stop reloading imported .mesh files when they change on disk"""
+    bl_idname = "import_mesh.stop_watching"
+    bl_label = "Stop Watching .mesh Files"
+
+    def execute(self, context):
+        stop_watching()
+        return {'FINISHED'}
+
+
+# Only needed if you want to add into a dynamic menu
+def menu_func_import(self, context):
+    self.layout.operator(ImportMeshData.bl_idname, text="SOASE (.mesh)")
+
+
+def register():
+    bpy.utils.register_class(ImportMeshData)
+    bpy.utils.register_class(StopWatchingMeshData)
+    bpy.types.TOPBAR_MT_file_import.append(menu_func_import)
+
+
+def unregister():
+    stop_watching()
+    if bpy.app.timers.is_registered(watch_timer):
+        bpy.app.timers.unregister(watch_timer)
+    bpy.utils.unregister_class(StopWatchingMeshData)
+    bpy.utils.unregister_class(ImportMeshData)
+    bpy.types.TOPBAR_MT_file_import.remove(menu_func_import)
+
+
+if __name__ == "__main__":
+    register()
+
+    # test call
+    bpy.ops.import_mesh.mesh_data('INVOKE_DEFAULT')
@@ -0,0 +1,233 @@
+import argparse
+import json
+import os
+import sqlite3
+import sys
+
+from mesh_io import READ_ERRORS, detect_format, find_mesh_files, run_jobs, scan_mesh_file
+
+#Searchable SQLite index of the .mesh files in a mod, no bpy required
+#
+#Only the header, materials and points of each file are read, so indexing a
+#whole mod takes seconds. Updates only rescan files whose size or modification
+#time changed and drop files that are gone.
+#
+#   python -m mesh_index update index.db path/to/mod
+#   python -m mesh_index query index.db [--min-triangles N] [--max-triangles N]
+#                                       [--texture PATTERN] [--point PATTERN] [--json]
+#
+#Patterns use SQL LIKE wildcards, % for any text and _ for one character.
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    id INTEGER PRIMARY KEY,
+    path TEXT UNIQUE NOT NULL,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    format TEXT NOT NULL,
+    vertices INTEGER NOT NULL,
+    triangles INTEGER NOT NULL,
+    bounding_radius REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS materials (
+    file_id INTEGER NOT NULL REFERENCES files(id) ON DELETE CASCADE,
+    material_index INTEGER NOT NULL,
+    diffuse_texture TEXT,
+    self_illumination_texture TEXT,
+    normal_texture TEXT,
+    displacement_texture TEXT,
+    team_color_texture TEXT
+);
+CREATE TABLE IF NOT EXISTS points (
+    file_id INTEGER NOT NULL REFERENCES files(id) ON DELETE CASCADE,
+    name TEXT NOT NULL,
+    x REAL, y REAL, z REAL
+);
+CREATE INDEX IF NOT EXISTS materials_file ON materials(file_id);
+CREATE INDEX IF NOT EXISTS points_file ON points(file_id);
+CREATE INDEX IF NOT EXISTS points_name ON points(name);
+CREATE INDEX IF NOT EXISTS files_triangles ON files(triangles);
+"""
+
+TEXTURE_COLUMNS = ("diffuse_texture",
+                    "self_illumination_texture",
+                    "normal_texture",
+                    "displacement_texture",
+                    "team_color_texture")
+
+def scan_file(filepath):
+    """
+    Returns a JSON ready summary of one file's header, materials and points, or an error
+    """
+    try:
+        stat = os.stat(filepath)
+        mesh = scan_mesh_file(filepath)
+    except READ_ERRORS as error:
+        return {"path": filepath, "error": str(error)}
+    if "NumVertices" not in mesh.declared_counts:
+        return {"path": filepath, "error": "no NumVertices section"}
+
+    return {
+        "path": filepath,
+        "size": stat.st_size,
+        "mtime_ns": stat.st_mtime_ns,
+        "format": detect_format(filepath),
+        "vertices": mesh.declared_counts.get("NumVertices", 0),
+        "triangles": mesh.declared_counts.get("NumTriangles", 0),
+        "bounding_radius": mesh.bounding_radius,
+        "materials": [[getattr(material, column) for column in TEXTURE_COLUMNS] for material in mesh.materials],
+        "points": [[point.name, *point.position] for point in mesh.points],
+    }
+
+class MeshIndex:
+    """
+    SQLite database of .mesh file summaries
+    """
+
+    def __init__(self, filepath):
+        self.connection = sqlite3.connect(filepath)
+        self.connection.execute("PRAGMA foreign_keys = ON")
+        self.connection.executescript(SCHEMA)
+
+    def close(self):
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def update(self, paths, max_workers=None):
+        """
+        Brings the index up to date with the .mesh files under paths
+
+        Returns (scanned entries, number of removed files). Unchanged files are
+        not opened, files under paths that no longer exist are removed.
+        """
+        known = {path: (size, mtime_ns) for path, size, mtime_ns in
+                    self.connection.execute("SELECT path, size, mtime_ns FROM files")}
+
+        found = [os.path.abspath(filepath) for filepath in find_mesh_files(paths)]
+        changed = []
+        for filepath in found:
+            try:
+                stat = os.stat(filepath)
+            except OSError:
+                continue
+            if known.get(filepath) != (stat.st_size, stat.st_mtime_ns):
+                changed.append(filepath)
+
+        roots = [os.path.join(os.path.abspath(path), "") if os.path.isdir(path) else os.path.abspath(path) for path in paths]
+        found = set(found)
+        removed = [path for path in known
+                    if path not in found and any(path == root or path.startswith(root) for root in roots)]
+
+        entries = run_jobs(scan_file, changed, max_workers)
+
+        with self.connection:
+            for path in removed:
+                self.connection.execute("DELETE FROM files WHERE path = ?", (path,))
+            for entry in entries:
+                self.connection.execute("DELETE FROM files WHERE path = ?", (entry["path"],))
+                if "error" not in entry:
+                    self.add_entry(entry)
+
+        return entries, len(removed)
+
+    def add_entry(self, entry):
+        cursor = self.connection.execute(
+            "INSERT INTO files (path, size, mtime_ns, format, vertices, triangles, bounding_radius) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (entry["path"], entry["size"], entry["mtime_ns"], entry["format"],
+                entry["vertices"], entry["triangles"], entry["bounding_radius"]))
+        file_id = cursor.lastrowid
+        self.connection.executemany(
+            "INSERT INTO materials (file_id, material_index, {}) VALUES (?, ?, ?, ?, ?, ?, ?)".format(", ".join(TEXTURE_COLUMNS)),
+            [(file_id, index, *textures) for index, textures in enumerate(entry["materials"])])
+        self.connection.executemany(
+            "INSERT INTO points (file_id, name, x, y, z) VALUES (?, ?, ?, ?, ?)",
+            [(file_id, *point) for point in entry["points"]])
+
+    def query(self, min_triangles=None, max_triangles=None, texture=None, point=None):
+        """
+        Returns file rows as dicts matching every given filter, ordered by path
+
+        texture matches any texture of any material and point any point name,
+        both as SQL LIKE patterns.
+        """
+        conditions = []
+        values = []
+        if min_triangles is not None:
+            conditions.append("triangles >= ?")
+            values.append(min_triangles)
+        if max_triangles is not None:
+            conditions.append("triangles <= ?")
+            values.append(max_triangles)
+        if texture is not None:
+            matches = " OR ".join(column + " LIKE ?" for column in TEXTURE_COLUMNS)
+            conditions.append("id IN (SELECT file_id FROM materials WHERE {})".format(matches))
+            values.extend([texture] * len(TEXTURE_COLUMNS))
+        if point is not None:
+            conditions.append("id IN (SELECT file_id FROM points WHERE name LIKE ?)")
+            values.append(point)
+
+        sql = "SELECT path, format, size, vertices, triangles, bounding_radius FROM files"
+        if conditions:
+            sql += " WHERE " + " AND ".join(conditions)
+        cursor = self.connection.execute(sql + " ORDER BY path", values)
+        columns = [column[0] for column in cursor.description]
+        return [dict(zip(columns, row)) for row in cursor]
+
+def command_update(args):
+    with MeshIndex(args.database) as index:
+        entries, removed = index.update(args.paths, args.jobs)
+
+    failed = 0
+    for entry in entries:
+        if "error" in entry:
+            failed += 1
+            print("{}: {}".format(entry["path"], entry["error"]), file=sys.stderr)
+
+    print("Scanned {} changed files, removed {}".format(len(entries), removed))
+    return 1 if failed else 0
+
+def command_query(args):
+    with MeshIndex(args.database) as index:
+        rows = index.query(args.min_triangles, args.max_triangles, args.texture, args.point)
+
+    if args.json:
+        json.dump(rows, sys.stdout, indent=2)
+        print()
+        return 0
+
+    for row in rows:
+        print("{path}: {triangles} triangles, {vertices} vertices".format(**row))
+    print("{} files".format(len(rows)))
+    return 0
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="mesh_index", description="Index and search the .mesh files of a mod")
+    parser.add_argument("--jobs", "-j", type=int, default=None, help="worker processes, defaults to the CPU count")
+    commands = parser.add_subparsers(dest="command")
+    commands.required = True
+
+    update = commands.add_parser("update", help="scan new and changed files into the index")
+    update.add_argument("database")
+    update.add_argument("paths", nargs="+")
+    update.set_defaults(function=command_update)
+
+    query = commands.add_parser("query", help="list indexed files matching all filters")
+    query.add_argument("database")
+    query.add_argument("--min-triangles", type=int)
+    query.add_argument("--max-triangles", type=int)
+    query.add_argument("--texture", help="LIKE pattern matched against every material texture")
+    query.add_argument("--point", help="LIKE pattern matched against point names")
+    query.add_argument("--json", action="store_true", help="write the matches as JSON")
+    query.set_defaults(function=command_query)
+
+    args = parser.parse_args(argv)
+    return args.function(args)
+
+if __name__ == "__main__":
+    sys.exit(main())
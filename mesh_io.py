@@ -0,0 +1,314 @@
+import argparse
+import codecs
+import concurrent.futures
+import json
+import logging
+import multiprocessing
+import os
+import struct
+import sys
+
+from mesh_binary import EXTENSION as BINARY_EXTENSION, MAGIC, read_mesh_binary, scan_mesh_binary, write_mesh_binary
+from mesh_data import validate_mesh
+from mesh_text import read_mesh_text, scan_mesh_text, write_mesh_text
+from mesh_timing import NO_TIMINGS
+
+#Format independent .mesh reading and writing, no bpy required
+#
+#"TXT" is the game's text .mesh format. "BIN" is the add-on's own lossless
+#binary format (.meshbin, see mesh_binary.py), which loads much faster but
+#which the game cannot read. The game's own binary .mesh layout is not
+#implemented: such files are recognised and rejected with GAME_BINARY_ERROR.
+#
+#Also usable from the command line without Blender:
+#
+#   python -m mesh_io convert SOURCE DEST [--format BIN]
+#   python -m mesh_io validate PATH...
+#   python -m mesh_io stats PATH... [--json]
+#
+#Directories are searched recursively for .mesh files and processed in a worker pool.
+
+FORMATS = ("TXT", "BIN")
+
+#The game's own binary .mesh files are not supported, only its text ones
+GAME_BINARY_ERROR = "binary game .mesh files are not supported, convert them to text with the game's ConvertData tool first"
+
+def detect_format(filepath):
+    """
+    Returns "BIN" for a .meshbin file or "TXT" for a text .mesh file, from its first bytes
+
+    Game text files start with "TXT". A file starting with the game's "BIN"
+    magic, or any other file whose start is not text, is a binary game .mesh
+    and raises ValueError instead of failing somewhere inside the text parser.
+    """
+    with open(filepath, 'rb') as f:
+        start = f.read(64)
+    if start.startswith(MAGIC):
+        return "BIN"
+    if start.startswith(b"TXT"):
+        return "TXT"
+    if start.startswith(b"BIN") or b"\0" in start:
+        raise ValueError(GAME_BINARY_ERROR)
+    try:
+        codecs.getincrementaldecoder("utf-8")().decode(start)
+    except UnicodeDecodeError:
+        raise ValueError(GAME_BINARY_ERROR) from None
+    return "TXT"
+
+def read_mesh_file(filepath, cache=None, timings=NO_TIMINGS):
+    """
+    Reads a text .mesh or a .meshbin file into MeshData
+
+    With a ParseCache, text files are loaded from the cache when unchanged and
+    stored in it after parsing. Binary files are always mapped directly.
+    Mapping and cache loads are timed as the "read" stage, text parsing as "parse".
+    """
+    if detect_format(filepath) == "BIN":
+        with timings.stage("read"):
+            return read_mesh_binary(filepath)
+
+    if cache is None:
+        with timings.stage("parse"):
+            return read_mesh_text(filepath)
+
+    with timings.stage("read"):
+        mesh = cache.load(filepath)
+    if mesh is None:
+        with timings.stage("parse"):
+            mesh = read_mesh_text(filepath)
+        cache.store(filepath, mesh)
+    return mesh
+
+def scan_mesh_file(filepath):
+    """
+    Reads only the header, materials and points of a text .mesh or a .meshbin file
+
+    The returned MeshData has no vertices or triangles, the section counts are
+    in its declared_counts.
+    """
+    if detect_format(filepath) == "BIN":
+        return scan_mesh_binary(filepath)
+    return scan_mesh_text(filepath)
+
+def write_mesh_file(filepath, mesh, file_format="TXT", timings=NO_TIMINGS, progress=None, section_cache=None):
+    """
+    Writes MeshData to a file in the given format, "TXT" for a .mesh or "BIN" for a .meshbin
+
+    The file is written under a temporary name and renamed when complete, so an
+    existing file is only replaced by a whole one. progress, if given, is called
+    with the fraction written so far and may raise to abandon the write. With a
+    SectionCache, text sections unchanged since the last write to filepath are
+    copied from the cache instead of being formatted again.
+    """
+    if file_format not in FORMATS:
+        raise ValueError("Unknown .mesh format " + repr(file_format))
+
+    sections = None
+    if section_cache is not None and file_format == "TXT":
+        sections = section_cache.get_target(filepath)
+
+    temp_path = filepath + ".tmp"
+    try:
+        if file_format == "BIN":
+            with timings.stage("write"):
+                write_mesh_binary(temp_path, mesh)
+            if progress is not None:
+                progress(1.0)
+        else:
+            write_mesh_text(temp_path, mesh, timings, progress, sections)
+        os.replace(temp_path, filepath)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        if sections is not None:
+            sections.discard()
+        raise
+
+    if sections is not None:
+        sections.commit()
+
+def read_mesh_files(filepaths, max_workers=None, executable=None, cache=None):
+    """
+    Reads many .mesh files in parallel worker processes
+
+    Yields (filepath, MeshData, None) in the order the files finish, or
+    (filepath, None, error) for a file that could not be read, so one bad file
+    does not stop the others. Reading needs no bpy, so the workers are plain
+    Python processes started with spawn; executable overrides the Python
+    interpreter they run in and cache is passed on to read_mesh_file.
+    """
+    filepaths = list(filepaths)
+    if len(filepaths) < 2 or max_workers == 1:
+        for filepath in filepaths:
+            try:
+                yield filepath, read_mesh_file(filepath, cache), None
+            except READ_ERRORS as error:
+                yield filepath, None, error
+        return
+
+    mp_context = multiprocessing.get_context("spawn")
+    if executable:
+        mp_context.set_executable(executable)
+
+    with concurrent.futures.ProcessPoolExecutor(max_workers, mp_context=mp_context) as pool:
+        futures = {pool.submit(read_mesh_file, filepath, cache): filepath for filepath in filepaths}
+        for future in concurrent.futures.as_completed(futures):
+            try:
+                yield futures[future], future.result(), None
+            except READ_ERRORS as error:
+                yield futures[future], None, error
+
+
+#Errors a malformed file can raise while being read, struct.error from a truncated .meshbin
+READ_ERRORS = (OSError, ValueError, KeyError, IndexError, struct.error)
+
+def find_mesh_files(paths):
+    """
+    Yields .mesh and .meshbin files from a list of files and directories, searching directories recursively
+    """
+    for path in paths:
+        if not os.path.isdir(path):
+            yield path
+            continue
+        for root, dirs, files in os.walk(path):
+            dirs.sort()
+            for name in sorted(files):
+                if name.lower().endswith((".mesh", BINARY_EXTENSION)):
+                    yield os.path.join(root, name)
+
+def convert_file(job):
+    source, dest, file_format = job
+    try:
+        mesh = read_mesh_file(source)
+        os.makedirs(os.path.dirname(dest) or ".", exist_ok=True)
+        write_mesh_file(dest, mesh, file_format)
+    except READ_ERRORS as error:
+        return source, str(error)
+    return source, None
+
+def validate_file(filepath):
+    try:
+        mesh = read_mesh_file(filepath)
+    except READ_ERRORS as error:
+        return filepath, ["could not be read: " + str(error)]
+    return filepath, validate_mesh(mesh)
+
+def get_file_stats(filepath):
+    try:
+        mesh = read_mesh_file(filepath)
+    except READ_ERRORS as error:
+        return {"path": filepath, "error": str(error)}
+    return {
+        "path": filepath,
+        "format": detect_format(filepath),
+        "size": os.path.getsize(filepath),
+        "materials": len(mesh.materials),
+        "points": len(mesh.points),
+        "vertices": mesh.num_vertices,
+        "triangles": mesh.num_triangles,
+        "bounding_radius": mesh.bounding_radius,
+    }
+
+def run_jobs(function, jobs, max_workers):
+    """
+    Maps function over jobs in a process pool, in order, or inline for a single job
+    """
+    jobs = list(jobs)
+    if len(jobs) < 2 or max_workers == 1:
+        return [function(job) for job in jobs]
+    with concurrent.futures.ProcessPoolExecutor(max_workers) as pool:
+        return list(pool.map(function, jobs, chunksize=4))
+
+def get_converted_path(filepath, file_format):
+    """
+    Returns filepath with the extension of file_format
+    """
+    return os.path.splitext(filepath)[0] + (BINARY_EXTENSION if file_format == "BIN" else ".mesh")
+
+def command_convert(args):
+    if os.path.isdir(args.source):
+        jobs = []
+        for source in find_mesh_files([args.source]):
+            relative = get_converted_path(os.path.relpath(source, args.source), args.format)
+            jobs.append((source, os.path.join(args.dest, relative), args.format))
+    else:
+        jobs = [(args.source, args.dest, args.format)]
+
+    failed = 0
+    for source, error in run_jobs(convert_file, jobs, args.jobs):
+        if error:
+            failed += 1
+            print("{}: {}".format(source, error), file=sys.stderr)
+
+    print("Converted {} of {} files".format(len(jobs) - failed, len(jobs)))
+    return 1 if failed else 0
+
+def command_validate(args):
+    filepaths = list(find_mesh_files(args.paths))
+    invalid = 0
+    for filepath, problems in run_jobs(validate_file, filepaths, args.jobs):
+        if problems:
+            invalid += 1
+            for problem in problems:
+                print("{}: {}".format(filepath, problem))
+
+    print("{} of {} files valid".format(len(filepaths) - invalid, len(filepaths)))
+    return 1 if invalid else 0
+
+def command_stats(args):
+    filepaths = list(find_mesh_files(args.paths))
+    stats = run_jobs(get_file_stats, filepaths, args.jobs)
+    readable = [entry for entry in stats if "error" not in entry]
+
+    totals = {
+        "files": len(stats),
+        "unreadable": len(stats) - len(readable),
+        "size": sum(entry["size"] for entry in readable),
+        "vertices": sum(entry["vertices"] for entry in readable),
+        "triangles": sum(entry["triangles"] for entry in readable),
+    }
+
+    if args.json:
+        json.dump({"files": stats, "totals": totals}, sys.stdout, indent=2)
+        print()
+        return 0
+
+    for entry in stats:
+        if "error" in entry:
+            print("{}: {}".format(entry["path"], entry["error"]))
+        else:
+            print("{path}: {format} {vertices} vertices, {triangles} triangles, "
+                    "{materials} materials, {points} points, {size} bytes".format(**entry))
+    print("{files} files, {vertices} vertices, {triangles} triangles, {size} bytes".format(**totals))
+    return 0
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="mesh_io", description="Convert, validate and inspect SOASE .mesh files")
+    parser.add_argument("--jobs", "-j", type=int, default=None, help="worker processes, defaults to the CPU count")
+    parser.add_argument("--verbose", "-v", action="store_true", help="log progress")
+    commands = parser.add_subparsers(dest="command")
+    commands.required = True
+
+    convert = commands.add_parser("convert", help="convert a file or directory tree to another format")
+    convert.add_argument("source")
+    convert.add_argument("dest")
+    convert.add_argument("--format", choices=FORMATS, default="TXT",
+                            help="TXT for game .mesh files, BIN for the add-on's .meshbin format the game cannot load")
+    convert.set_defaults(function=command_convert)
+
+    validate = commands.add_parser("validate", help="check counts and index ranges")
+    validate.add_argument("paths", nargs="+")
+    validate.set_defaults(function=command_validate)
+
+    stats = commands.add_parser("stats", help="report counts for files and directory trees")
+    stats.add_argument("paths", nargs="+")
+    stats.add_argument("--json", action="store_true", help="write the report as JSON")
+    stats.set_defaults(function=command_stats)
+
+    args = parser.parse_args(argv)
+    if args.verbose:
+        logging.basicConfig(level=logging.DEBUG, format="%(message)s")
+    return args.function(args)
+
+if __name__ == "__main__":
+    sys.exit(main())
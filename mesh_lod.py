@@ -0,0 +1,245 @@
+import numpy as np
+
+from mesh_data import MeshData
+from mesh_optimize import build_adjacency
+
+#Level of detail generation by quadric error decimation, no bpy required
+
+DEFAULT_LOD_RATIOS = (0.5, 0.25, 0.125, 0.0625)
+
+#Cosine of the largest normal turn a single collapse may cause
+MIN_NORMAL_COS = 0.25
+
+def get_edges(triangles):
+    """
+    Returns the unique undirected edges of a triangle list and how many triangles use each
+    """
+    edges = np.sort(triangles[:, [0, 1, 1, 2, 2, 0]].reshape(-1, 2), axis=1)
+    return np.unique(edges, axis=0, return_counts=True)
+
+def get_face_normals(positions, triangles):
+    """
+    Returns the unnormalised normal of each triangle, its length twice the area
+    """
+    corners = positions[triangles]
+    return np.cross(corners[:, 1] - corners[:, 0], corners[:, 2] - corners[:, 0])
+
+def calc_quadrics(positions, triangles):
+    """
+    Returns the area weighted sum of the plane quadrics of each vertex's triangles, (n, 4, 4)
+    """
+    corners = positions[triangles]
+    normals = get_face_normals(positions, triangles)
+    areas = np.linalg.norm(normals, axis=1)
+    normals /= np.where(areas > 0, areas, 1)[:, None]
+
+    planes = np.hstack([normals, -np.einsum("ij,ij->i", normals, corners[:, 0])[:, None]])
+    plane_quadrics = planes[:, :, None] * planes[:, None, :] * (areas / 2)[:, None, None]
+
+    quadrics = np.zeros((len(positions), 4, 4))
+    for corner in range(3):
+        np.add.at(quadrics, triangles[:, corner], plane_quadrics)
+    return quadrics
+
+def find_locked_vertices(mesh):
+    """
+    Returns a mask of vertices that must not move
+
+    These are vertices on open edges, which includes UV seams and hard edges
+    since welded vertices there are split, and vertices shared by triangles of
+    different materials.
+    """
+    locked = np.zeros(mesh.num_vertices, dtype=bool)
+    edges, counts = get_edges(mesh.triangles)
+    locked[edges[counts != 2].ravel()] = True
+
+    corners = mesh.triangles.ravel()
+    corner_materials = np.repeat(mesh.material_ids, 3)
+    lowest = np.full(mesh.num_vertices, np.iinfo(np.int32).max, dtype=np.int32)
+    highest = np.full(mesh.num_vertices, np.iinfo(np.int32).min, dtype=np.int32)
+    np.minimum.at(lowest, corners, corner_materials)
+    np.maximum.at(highest, corners, corner_materials)
+    locked |= highest > lowest
+    return locked
+
+def find_flips(positions, triangles, original_normals, sources, targets):
+    """
+    Returns a mask of the collapses sources -> targets that would flip a triangle
+
+    Triangles around each source that do not contain its target are checked
+    with the source moved onto the target, all collapses at once. A triangle
+    counts as flipped when its normal would turn by more than about 75 degrees
+    from either its current or its original normal, or it would become
+    degenerate. original_normals holds the normal each triangle had before
+    decimation started.
+    """
+    offsets, adjacent = build_adjacency(triangles, len(positions))
+    counts = offsets[sources + 1] - offsets[sources]
+    collapse = np.repeat(np.arange(len(sources)), counts)
+    starts = np.repeat(offsets[sources] - np.cumsum(counts) + counts, counts)
+    face_indices = adjacent[starts + np.arange(counts.sum())]
+    faces = triangles[face_indices]
+
+    source = sources[collapse][:, None]
+    target = targets[collapse][:, None]
+    moved = np.where(faces == source, target, faces)
+
+    old_normals = get_face_normals(positions, faces)
+    new_normals = get_face_normals(positions, moved)
+    lengths = np.linalg.norm(old_normals, axis=1) * np.linalg.norm(new_normals, axis=1)
+    flipped = np.einsum("ij,ij->i", old_normals, new_normals) <= MIN_NORMAL_COS * lengths
+
+    #Turns allowed one pass at a time add up, which can stand triangles on edge
+    #over several passes, so the original normal has to be kept to as well
+    original = original_normals[face_indices]
+    lengths = np.linalg.norm(original, axis=1) * np.linalg.norm(new_normals, axis=1)
+    flipped |= (np.einsum("ij,ij->i", original, new_normals) <= MIN_NORMAL_COS * lengths) & (lengths > 0)
+    flipped &= ~np.any(faces == target, axis=1)
+
+    flips = np.zeros(len(sources), dtype=bool)
+    np.logical_or.at(flips, collapse, flipped)
+    return flips
+
+def select_collapses(triangles, num_vertices, sources, targets, limit):
+    """
+    Picks collapses in order that do not touch each other's triangles, at most limit
+    """
+    offsets, adjacent = build_adjacency(triangles, num_vertices)
+    offsets = offsets.tolist()
+    adjacent = adjacent.tolist()
+    tri_list = triangles.tolist()
+    touched = bytearray(num_vertices)
+
+    selected = []
+    for index, (source, target) in enumerate(zip(sources.tolist(), targets.tolist())):
+        if touched[source] or touched[target]:
+            continue
+        selected.append(index)
+        for t in adjacent[offsets[source]:offsets[source + 1]]:
+            for v in tri_list[t]:
+                touched[v] = 1
+        if len(selected) >= limit:
+            break
+    return np.array(selected, dtype=np.int64)
+
+def decimate_triangles(positions, triangles, locked, target_count, progress=None):
+    """
+    Collapses edges in order of quadric error until at most target_count triangles remain
+
+    Every collapse moves one unlocked vertex onto a neighbour, so no new
+    vertices or attribute values are made. Each pass scores every edge in both
+    directions at once, drops collapses that would flip triangles and applies
+    the cheapest set that do not share triangles. Stops early when nothing can
+    be collapsed. Returns the remaining triangles and a mask of kept triangles
+    relative to the input. progress, if given, is called before every pass
+    with the fraction of the triangles to remove that are gone, and may raise
+    to stop.
+    """
+    positions = np.asarray(positions, dtype=np.float64)
+    quadrics = calc_quadrics(positions, triangles)
+    original_normals = get_face_normals(positions, triangles)
+    alive = np.arange(len(triangles))
+    to_remove = max(len(triangles) - target_count, 1)
+
+    while len(triangles) > target_count:
+        if progress is not None:
+            progress(1 - (len(triangles) - target_count) / to_remove)
+        edges, counts = get_edges(triangles)
+        sources = np.concatenate([edges[:, 0], edges[:, 1]])
+        targets = np.concatenate([edges[:, 1], edges[:, 0]])
+        movable = ~locked[sources]
+        sources = sources[movable]
+        targets = targets[movable]
+        if len(sources) == 0:
+            break
+
+        homogeneous = np.hstack([positions[targets], np.ones((len(targets), 1))])
+        costs = np.einsum("ei,eij,ej->e", homogeneous, quadrics[sources] + quadrics[targets], homogeneous)
+
+        #Each collapse removes about two triangles, score a few times that many
+        needed = (len(triangles) - target_count + 1) // 2
+        order = np.argsort(costs, kind="stable")[:max(4 * needed, 1024)]
+        sources = sources[order]
+        targets = targets[order]
+
+        keep = ~find_flips(positions, triangles, original_normals[alive], sources, targets)
+        sources = sources[keep]
+        targets = targets[keep]
+
+        selected = select_collapses(triangles, len(positions), sources, targets, needed)
+        if len(selected) == 0:
+            break
+        sources = sources[selected]
+        targets = targets[selected]
+
+        np.add.at(quadrics, targets, quadrics[sources])
+        remap = np.arange(len(positions))
+        remap[sources] = targets
+        triangles = remap[triangles]
+
+        valid = ((triangles[:, 0] != triangles[:, 1])
+                    & (triangles[:, 1] != triangles[:, 2])
+                    & (triangles[:, 0] != triangles[:, 2]))
+        triangles = triangles[valid]
+        alive = alive[valid]
+
+    return triangles, alive
+
+def remove_unused_vertices(mesh):
+    """
+    Drops vertices no triangle uses, in place, keeping the order of the rest
+    """
+    used = np.zeros(mesh.num_vertices, dtype=bool)
+    used[mesh.triangles.ravel()] = True
+    keep = np.flatnonzero(used)
+
+    remap = np.full(mesh.num_vertices, -1, dtype=np.int32)
+    remap[keep] = np.arange(len(keep), dtype=np.int32)
+
+    return mesh.select_vertices(keep, remap)
+
+def decimate_mesh(mesh, target_count, progress=None):
+    """
+    Returns a new MeshData simplified to at most target_count triangles where possible
+
+    Vertices on UV seams, hard edges, open edges and material boundaries stay
+    in place, so those outlines and their texturing are kept. The vertices
+    should already be welded, otherwise every edge is open and nothing can be
+    collapsed. Bounds and cached indices are left for the caller to recompute.
+    progress is passed on to decimate_triangles.
+    """
+    triangles, alive = decimate_triangles(mesh.positions,
+                                            mesh.triangles.astype(np.int64),
+                                            find_locked_vertices(mesh),
+                                            target_count,
+                                            progress)
+
+    lod = MeshData(positions=mesh.positions,
+                    normals=mesh.normals,
+                    tangents=mesh.tangents,
+                    colors=mesh.colors,
+                    uv0=mesh.uv0,
+                    uv1=mesh.uv1,
+                    triangles=triangles,
+                    material_ids=mesh.material_ids[alive],
+                    materials=mesh.materials,
+                    points=mesh.points)
+    lod.max_diffuse_mip_level = mesh.max_diffuse_mip_level
+    lod.has_valid_tangents = mesh.has_valid_tangents
+    return remove_unused_vertices(lod)
+
+def generate_lods(mesh, ratios=DEFAULT_LOD_RATIOS, progress=None):
+    """
+    Yields a decimated MeshData for each ratio of the original triangle count
+
+    Each level is decimated from the previous one, so ratios should decrease.
+    progress, if given, is called with the index of the level being decimated
+    and the fraction of it done, and may raise to stop.
+    """
+    lod = mesh
+    for level, ratio in enumerate(ratios):
+        level_progress = None
+        if progress is not None:
+            level_progress = lambda fraction, level=level: progress(level, fraction)
+        lod = decimate_mesh(lod, int(mesh.num_triangles * ratio), level_progress)
+        yield lod
@@ -0,0 +1,167 @@
+import collections
+import numpy as np
+
+#Triangle and vertex order optimisation for the GPU vertex caches, no bpy required
+
+DEFAULT_CACHE_SIZE = 16
+
+def calc_acmr(triangles, cache_size=DEFAULT_CACHE_SIZE):
+    """
+    Returns the average cache miss ratio of a triangle list for a FIFO post-transform cache
+
+    That is the number of vertex shader runs per triangle, between 0.5 for an
+    ideal mesh and 3.0 when no vertex is ever reused.
+    """
+    if len(triangles) == 0:
+        return 0.0
+
+    cache = collections.deque()
+    cached = set()
+    misses = 0
+    for index in np.asarray(triangles).ravel().tolist():
+        if index in cached:
+            continue
+        misses += 1
+        cache.append(index)
+        cached.add(index)
+        if len(cache) > cache_size:
+            cached.discard(cache.popleft())
+    return misses / len(triangles)
+
+def build_adjacency(triangles, num_vertices):
+    """
+    Returns (offsets, triangle indices) listing the triangles using each vertex, CSR style
+    """
+    corners = np.asarray(triangles).ravel()
+    order = np.argsort(corners, kind="stable")
+    counts = np.bincount(corners, minlength=num_vertices)
+    offsets = np.zeros(num_vertices + 1, dtype=np.int64)
+    np.cumsum(counts, out=offsets[1:])
+    return offsets, order // 3
+
+#Triangles Tipsify emits between progress reports
+PROGRESS_INTERVAL = 1 << 14
+
+def tipsify(triangles, num_vertices, cache_size=DEFAULT_CACHE_SIZE, progress=None):
+    """
+    Returns a triangle order with good vertex cache reuse
+
+    Implements Tipsify (Sander, Nehab and Barczak, "Fast Triangle Reordering
+    for Vertex Locality and Reduced Overdraw", 2007), which fans around one
+    vertex at a time and picks the next fanning vertex among those that will
+    still be in the cache. It runs in linear time. progress, if given, is
+    called every PROGRESS_INTERVAL triangles with the fraction ordered and may
+    raise to stop.
+    """
+    number_tris = len(triangles)
+    if number_tris == 0:
+        return np.zeros(0, dtype=np.int64)
+
+    offsets, adjacent = build_adjacency(triangles, num_vertices)
+    offsets = offsets.tolist()
+    adjacent = adjacent.tolist()
+    tri_list = np.asarray(triangles).tolist()
+
+    live = np.diff(offsets).tolist()
+    stamps = [0] * num_vertices
+    emitted = [False] * number_tris
+    dead_end = []
+    output = []
+
+    time = cache_size + 1
+    cursor = 0
+    fan = int(tri_list[0][0])
+    next_report = PROGRESS_INTERVAL
+
+    while fan >= 0:
+        if progress is not None and len(output) >= next_report:
+            progress(len(output) / number_tris)
+            next_report += PROGRESS_INTERVAL
+        candidates = []
+        for t in adjacent[offsets[fan]:offsets[fan + 1]]:
+            if emitted[t]:
+                continue
+            emitted[t] = True
+            output.append(t)
+            for v in tri_list[t]:
+                dead_end.append(v)
+                candidates.append(v)
+                live[v] -= 1
+                if time - stamps[v] > cache_size:
+                    stamps[v] = time
+                    time += 1
+
+        #Pick the candidate that will still be cached after its remaining triangles
+        fan = -1
+        best = -1
+        for v in candidates:
+            if live[v] > 0:
+                priority = 0
+                if time - stamps[v] + 2 * live[v] <= cache_size:
+                    priority = time - stamps[v]
+                if priority > best:
+                    best = priority
+                    fan = v
+
+        #Dead end, fall back to recently used vertices then scan forwards
+        if fan < 0:
+            while dead_end:
+                v = dead_end.pop()
+                if live[v] > 0:
+                    fan = v
+                    break
+        if fan < 0:
+            while cursor < num_vertices:
+                if live[cursor] > 0:
+                    fan = cursor
+                    break
+                cursor += 1
+
+    return np.array(output, dtype=np.int64)
+
+def reorder_vertices(mesh):
+    """
+    Renumbers vertices in the order the triangles first use them, in place
+
+    Unused vertices are moved to the end.
+    """
+    corners = mesh.triangles.ravel()
+    _, first = np.unique(corners, return_index=True)
+    used = corners[np.sort(first)]
+
+    unused = np.ones(mesh.num_vertices, dtype=bool)
+    unused[used] = False
+    order = np.concatenate([used, np.flatnonzero(unused)])
+
+    remap = np.empty(mesh.num_vertices, dtype=np.int32)
+    remap[order] = np.arange(mesh.num_vertices, dtype=np.int32)
+
+    return mesh.select_vertices(order, remap)
+
+def optimize_vertex_cache(mesh, cache_size=DEFAULT_CACHE_SIZE, progress=None):
+    """
+    Reorders triangles for vertex cache reuse and vertices for fetch locality, in place
+
+    Triangles stay grouped by material. Returns the ACMR before and after.
+    progress, if given, is called with the fraction of triangles ordered and
+    may raise to stop.
+    """
+    acmr_before = calc_acmr(mesh.triangles, cache_size)
+
+    order = []
+    done = 0
+    for material_id in np.unique(mesh.material_ids):
+        group = np.flatnonzero(mesh.material_ids == material_id)
+        group_progress = None
+        if progress is not None:
+            group_progress = lambda fraction, done=done, size=len(group): progress((done + fraction * size) / mesh.num_triangles)
+        order.append(group[tipsify(mesh.triangles[group], mesh.num_vertices, cache_size, group_progress)])
+        done += len(group)
+
+    if order:
+        order = np.concatenate(order)
+        mesh.triangles = mesh.triangles[order]
+        mesh.material_ids = mesh.material_ids[order]
+    reorder_vertices(mesh)
+
+    return acmr_before, calc_acmr(mesh.triangles, cache_size)
@@ -0,0 +1,665 @@
+import array
+import functools
+import mmap
+import re
+import shutil
+import numpy as np
+
+from mesh_data import CACHED_DIRECTIONS, MeshData, Material, Point
+from mesh_timing import NO_TIMINGS, logger
+
+#Text (TXT) .mesh reading and writing, no bpy required
+
+#Number of blocks formatted per chunk when writing, and the file buffer size
+CHUNK_SIZE = 4096
+WRITE_BUFFER_SIZE = 1 << 20
+
+#Part of every cached section's digest, increase it whenever the text written
+#for the same values changes so sections cached by older versions are not reused
+TEXT_FORMAT_VERSION = 1
+
+def get_string_value(entry):
+    return entry.split(None, 1)[1].strip('"')
+
+def get_float_value(entry):
+    return float(entry.split()[1])
+
+def get_int_value(entry):
+    return int(entry.split()[1])
+
+def get_3list_value(entry):
+    list = entry.split()
+    x = float(list[2])
+    y = float(list[3])
+    z = float(list[4])
+    return (x, y, z)
+
+def get_3list_value_unnamed(entry):
+    list = entry.split()
+    x = float(list[1])
+    y = float(list[2])
+    z = float(list[3])
+    return (x, y, z)
+
+def parse_material(fields, rows):
+    return {key: get_string_value(entry) for key, entry in fields.items()}
+
+def parse_point(fields, rows):
+    name = get_string_value(fields["DataString"])
+    position = get_3list_value(fields["Position"])
+    orientation = [get_3list_value_unnamed(row) for row in rows]
+    return (name, position, orientation)
+
+def parse_vertex(fields, rows):
+    return (get_3list_value(fields["Position"]),
+            get_3list_value(fields["Normal"]),
+            get_3list_value(fields["Tangent"]),
+            get_int_value(fields["Color"]),
+            get_float_value(fields["U0"]),
+            get_float_value(fields["V0"]),
+            get_float_value(fields["U1"]),
+            get_float_value(fields["V1"]))
+
+def parse_triangle(fields, rows):
+    return (get_int_value(fields["iVertex0"]),
+            get_int_value(fields["iVertex1"]),
+            get_int_value(fields["iVertex2"]),
+            get_int_value(fields["iMaterial"]))
+
+block_parsers = {
+    "Material": parse_material,
+    "Point": parse_point,
+    "Vertex": parse_vertex,
+    "Triangle": parse_triangle,
+}
+
+material_keys = {
+    "DiffuseTextureFileName": "diffuse_texture",
+    "SelfIlluminationTextureFileName": "self_illumination_texture",
+    "NormalTextureFileName": "normal_texture",
+    "DisplacementTextureFileName": "displacement_texture",
+    "TeamColorTextureFileName": "team_color_texture",
+    "Diffuse": "diffuse",
+    "Ambient": "ambient",
+    "Specular": "specular",
+    "Emissive": "emissive",
+    "Glossiness": "glossiness",
+}
+
+def iter_mesh_records(lines):
+    """
+    Parses .mesh text in a single pass, yielding (kind, data) records
+
+    Material, Point, Vertex and Triangle blocks are yielded once complete with
+    their values converted, every other entry is yielded as (key, value string).
+    No tree is built, so lines can be read straight from an open file. Lines
+    indented deeper than a block's own line are its fields, whatever the
+    indentation is made of.
+    """
+    block = None
+    block_level = 0
+    fields = None
+    rows = None
+
+    for line in lines:
+        stripped = line.lstrip()
+        if not stripped:
+            continue
+
+        level = len(line) - len(stripped)
+        text = stripped.rstrip()
+
+        #Fields belonging to the current block
+        if block is not None and level > block_level:
+            if text[0] == "[":
+                rows.append(text)
+            else:
+                fields[text.split(None, 1)[0]] = text
+            continue
+
+        if block is not None:
+            yield block, block_parsers[block](fields, rows)
+            block = None
+
+        key = text.split(None, 1)[0]
+        if key in block_parsers:
+            block = key
+            block_level = level
+            fields = {}
+            rows = []
+        else:
+            yield key, text[len(key):].strip()
+
+    if block is not None:
+        yield block, block_parsers[block](fields, rows)
+
+def make_material(fields):
+    values = {material_keys[key]: value for key, value in fields.items() if key in material_keys}
+    if "glossiness" in values:
+        values["glossiness"] = float(values["glossiness"])
+    return Material(**values)
+
+def read_mesh_text(filepath):
+    """
+    Reads a text .mesh file into MeshData
+
+    Values are appended to flat typed buffers as records stream in, so memory
+    stays proportional to the resulting arrays.
+    """
+    positions = array.array('f')
+    normals = array.array('f')
+    tangents = array.array('f')
+    colors = array.array('I')
+    uv0 = array.array('f')
+    uv1 = array.array('f')
+    triangles = array.array('i')
+    material_ids = array.array('i')
+    materials = []
+    points = []
+    header = {}
+    cached_indices = {}
+    cached_direction = None
+
+    with open(filepath, 'r', encoding='utf-8') as f:
+        for kind, data in iter_mesh_records(f):
+            if kind == "Vertex":
+                positions.extend(data[0])
+                normals.extend(data[1])
+                tangents.extend(data[2])
+                colors.append(data[3])
+                uv0.extend(data[4:6])
+                uv1.extend(data[6:8])
+            elif kind == "Triangle":
+                triangles.extend(data[0:3])
+                material_ids.append(data[3])
+            elif kind == "Point":
+                name, position, orientation = data
+                points.append(Point(name, position, tuple(orientation)))
+            elif kind == "Material":
+                materials.append(make_material(data))
+            elif kind == "CachedVertexIndex":
+                cached_indices[cached_direction].append(int(data))
+            elif kind.startswith("NumCachedVertexIndicesInDirection:"):
+                cached_direction = kind.split(":", 1)[1]
+                cached_indices[cached_direction] = array.array('i')
+            else:
+                header[kind] = data
+
+    mesh = MeshData(positions=np.frombuffer(positions, dtype=np.float32),
+                    normals=np.frombuffer(normals, dtype=np.float32),
+                    tangents=np.frombuffer(tangents, dtype=np.float32),
+                    colors=np.frombuffer(colors, dtype=np.uint32),
+                    uv0=np.frombuffer(uv0, dtype=np.float32),
+                    uv1=np.frombuffer(uv1, dtype=np.float32),
+                    triangles=np.frombuffer(triangles, dtype=np.int32),
+                    material_ids=np.frombuffer(material_ids, dtype=np.int32),
+                    materials=materials,
+                    points=points,
+                    cached_indices={direction: np.frombuffer(indices, dtype=np.int32)
+                                    for direction, indices in cached_indices.items()})
+
+    return apply_header(mesh, header)
+
+def apply_header(mesh, header):
+    """
+    Sets the header values and declared_counts of mesh from (key, value string) entries
+    """
+    for label in ("NumMaterials", "NumPoints", "NumVertices", "NumTriangles"):
+        if label in header:
+            mesh.declared_counts[label] = int(header[label])
+
+    if "maxDiffuseMipLevel" in header:
+        mesh.max_diffuse_mip_level = int(header["maxDiffuseMipLevel"])
+    if "hasValidTangents" in header:
+        mesh.has_valid_tangents = header["hasValidTangents"] == "TRUE"
+    if "BoundingRadius" in header:
+        mesh.bounding_radius = float(header["BoundingRadius"])
+    if "MaxBoundingExtents" in header:
+        mesh.max_extents = get_3list_value_unnamed(header["MaxBoundingExtents"])
+    if "MinBoundingExtents" in header:
+        mesh.min_extents = get_3list_value_unnamed(header["MinBoundingExtents"])
+
+    return mesh
+
+def iter_decoded_lines(f, offset):
+    """
+    Yields the decoded lines of a binary file object, adding their byte lengths to offset[0]
+    """
+    for line in f:
+        offset[0] += len(line)
+        yield line.decode('utf-8')
+
+#The NumTriangles line at any indentation
+NUM_TRIANGLES_PATTERN = re.compile(rb"^[ \t]*NumTriangles[ \t]+(\d+)", re.MULTILINE)
+
+def scan_mesh_text(filepath):
+    """
+    Reads only the header, materials and points of a text .mesh file
+
+    Returns MeshData without vertices or triangles, their counts are in
+    declared_counts. Parsing stops at NumVertices and NumTriangles is found by
+    searching the raw bytes after it, so the vertex blocks are never parsed.
+    """
+    materials = []
+    points = []
+    header = {}
+    offset = [0]
+
+    with open(filepath, 'rb') as f:
+        for kind, data in iter_mesh_records(iter_decoded_lines(f, offset)):
+            if kind == "Point":
+                name, position, orientation = data
+                points.append(Point(name, position, tuple(orientation)))
+            elif kind == "Material":
+                materials.append(make_material(data))
+            else:
+                header[kind] = data
+                if kind == "NumVertices":
+                    break
+
+        if "NumVertices" in header:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+                match = NUM_TRIANGLES_PATTERN.search(buffer, offset[0])
+                if match:
+                    header["NumTriangles"] = match.group(1).decode('ascii')
+
+    return apply_header(MeshData(materials=materials, points=points), header)
+
+
+def write_indented(string, level):
+    return level * "\t" + string + "\n"
+
+def write_labeled_int(label, value):
+    return label + " " + str(int(value))
+
+def write_labeled_string(label, value):
+    conv = lambda i : i or ''
+    return label + " " + '"' + conv(value) + '"'
+
+def write_labeled_hex(label, value):
+    return label + " " + str(value)
+
+def write_labeled_float(label, value):
+    return label + " " + "{:.6f}".format(value)
+
+def write_3list(list):
+    return ("[ " + "{:.6f}".format(list[0]) + " "
+            + "{:.6f}".format(list[1]) + " "
+            + "{:.6f}".format(list[2]) + " ]")
+
+def write_labeled_3list(label, list):
+    return label + " " + write_3list(list)
+
+def write_header(mesh):
+    """
+    Writes the header values preceding the materials to string
+    """
+    output = write_indented(write_labeled_int("maxDiffuseMipLevel", mesh.max_diffuse_mip_level), 1)
+    output += write_indented("hasValidTangents " + ("TRUE" if mesh.has_valid_tangents else "FALSE"), 1)
+    output += write_indented(write_labeled_float("BoundingRadius", mesh.bounding_radius), 1)
+    output += write_indented(write_labeled_3list("MaxBoundingExtents", mesh.max_extents), 1)
+    output += write_indented(write_labeled_3list("MinBoundingExtents", mesh.min_extents), 1)
+    return output
+
+def format_material(material):
+    output = write_indented("Material", 1)
+    output += write_indented(write_labeled_string("DiffuseTextureFileName", material.diffuse_texture), 2)
+    output += write_indented(write_labeled_string("SelfIlluminationTextureFileName", material.self_illumination_texture), 2)
+    output += write_indented(write_labeled_string("NormalTextureFileName", material.normal_texture), 2)
+    output += write_indented(write_labeled_string("DisplacementTextureFileName", material.displacement_texture), 2)
+    output += write_indented(write_labeled_string("TeamColorTextureFileName", material.team_color_texture), 2)
+    output += write_indented(write_labeled_hex("Diffuse", material.diffuse), 2)
+    output += write_indented(write_labeled_hex("Ambient", material.ambient), 2)
+    output += write_indented(write_labeled_hex("Specular", material.specular), 2)
+    output += write_indented(write_labeled_hex("Emissive", material.emissive), 2)
+    output += write_indented(write_labeled_hex("Glossiness", material.glossiness), 2)
+    return output
+
+def format_point(point):
+    output = write_indented("Point", 1)
+    output += write_indented(write_labeled_string("DataString", point.name), 2)
+    output += write_indented(write_labeled_3list("Position", point.position), 2)
+    output += write_indented("Orientation", 2)
+    output += write_indented(" " + write_3list(point.orientation[0]), 3)
+    output += write_indented(" " + write_3list(point.orientation[1]), 3)
+    output += write_indented(" " + write_3list(point.orientation[2]), 3)
+    return output
+
+#One block per row of values, the fields are filled in order from the row
+VERTEX_TEMPLATE = (write_indented("Vertex", 1)
+                    + write_indented("Position [ %.6f %.6f %.6f ]", 2)
+                    + write_indented("Normal [ %.6f %.6f %.6f ]", 2)
+                    + write_indented("Tangent [ %.6f %.6f %.6f ]", 2)
+                    + write_indented("Color %d", 2)
+                    + write_indented("U0 %.6f", 2)
+                    + write_indented("V0 %.6f", 2)
+                    + write_indented("U1 %.6f", 2)
+                    + write_indented("V1 %.6f", 2))
+
+TRIANGLE_TEMPLATE = (write_indented("Triangle", 1)
+                        + write_indented("iVertex0 %d", 2)
+                        + write_indented("iVertex1 %d", 2)
+                        + write_indented("iVertex2 %d", 2)
+                        + write_indented("iMaterial %d", 2))
+
+CACHED_INDEX_TEMPLATE = write_indented("CachedVertexIndex %d", 1)
+
+#format_digits builds each batch of numbers right aligned to the width of its
+#longest value, padded with zero bytes that are dropped afterwards. Floats
+#below MAX_BULK_FLOAT still fit in an int64 with 6 decimals, and the 19
+#POWERS_OF_TEN cover the digits of any int64.
+MAX_BULK_FLOAT = 1e12
+POWERS_OF_TEN = 10 ** np.arange(19, dtype=np.int64)
+
+@functools.lru_cache()
+def parse_template(template):
+    """
+    Splits a template into its literal ASCII bytes and the decimals of each field, 0 for %d
+
+    Fields are %.6f or %d, returns (literals, decimals) with one more literal than fields.
+    """
+    parts = re.split(r"(%\.6f|%d)", template)
+    literals = tuple(part.encode("ascii") for part in parts[0::2])
+    decimals = tuple(6 if field == "%.6f" else 0 for field in parts[1::2])
+    return literals, decimals
+
+def format_digits(values, decimals):
+    """
+    Returns an (n, k) array of values as ASCII character planes, a (width, n, k) uint8 array
+
+    Plane i holds character i of every value, right aligned and padded with
+    zero bytes to the width of the longest value. With decimals the text
+    matches "%.<decimals>f" and values must be float32 below MAX_BULK_FLOAT,
+    so that scaling them is exact in float64 and np.rint rounds ties to even
+    like Python does. Without, values are integers formatted like "%d".
+    """
+    if decimals:
+        negative = np.signbit(values)
+        scaled = np.rint(np.abs(values.astype(np.float64)) * 10.0 ** decimals).astype(np.int64)
+    else:
+        values = values.astype(np.int64)
+        negative = values < 0
+        scaled = np.abs(values)
+
+    number_digits = np.maximum(np.searchsorted(POWERS_OF_TEN, scaled, side="right"), decimals + 1)
+    most_digits = int(number_digits.max(initial=1))
+    point = 1 if decimals else 0
+    width = most_digits + point + int(negative.any())
+
+    #Dividing by a scalar is much faster than by an array of powers, and int32 faster still
+    if most_digits < 10:
+        scaled = scaled.astype(np.int32)
+
+    #Digits past the front of a value are 0 and stay 0 instead of becoming "0"
+    planes = np.empty((width,) + values.shape, dtype=np.uint8)
+    for place in range(most_digits):
+        quotient = scaled // 10
+        digit = scaled - quotient * 10
+        if place > decimals:
+            digit += (number_digits > place) * ord("0")
+        else:
+            digit += ord("0")
+        planes[width - 1 - place - (point if place >= decimals else 0)] = digit
+        scaled = quotient
+
+    if decimals:
+        planes[width - 1 - decimals] = ord(".")
+    if width > most_digits + point:
+        planes[0] = 0
+    rows, columns = np.nonzero(negative)
+    planes[width - 1 - point - number_digits[rows, columns], rows, columns] = ord("-")
+    return planes
+
+def format_rows(template, columns):
+    """
+    Formats template once per row of the column arrays, joined into one string
+
+    Columns are (n) or (n, k) arrays whose values fill the template's fields
+    row by row, the result is the same as template * n % (row values...). The
+    characters of every field are made at once with NumPy. Columns that cannot
+    be done exactly that way, such as non-finite or float64 values, fall back
+    to % formatting.
+    """
+    literals, decimals = parse_template(template)
+    number_rows = len(columns[0])
+    columns = [column.reshape(number_rows, -1) for column in columns]
+    fields = [column[:, i] for column in columns for i in range(column.shape[1])]
+
+    #Float fields with 6 decimals in one batch and integer fields in another
+    floats = [values for values, places in zip(fields, decimals) if places]
+    integers = [values for values, places in zip(fields, decimals) if not places]
+
+    exact = all(values.dtype == np.float32 for values in floats)
+    if floats and exact:
+        floats = np.column_stack(floats)
+        exact = np.all(np.abs(floats) < MAX_BULK_FLOAT)
+    if not exact:
+        values = np.hstack([column.astype(np.float64) for column in columns])
+        return (template * number_rows) % tuple(values.ravel().tolist())
+
+    batches = {}
+    if len(floats):
+        batches[True] = iter(np.moveaxis(format_digits(floats, 6), 2, 0))
+    if integers:
+        batches[False] = iter(np.moveaxis(format_digits(np.column_stack(integers), 0), 2, 0))
+    sources = [next(batches[places > 0]) for places in decimals]
+
+    #Built a character column at a time, then transposed so each row is one block
+    width = sum(len(literal) for literal in literals) + sum(len(planes) for planes in sources)
+    text = np.empty((width, number_rows), dtype=np.uint8)
+    start = 0
+    for i, literal in enumerate(literals):
+        text[start:start + len(literal)] = np.frombuffer(literal, dtype=np.uint8)[:, None]
+        start += len(literal)
+        if i < len(sources):
+            text[start:start + len(sources[i])] = sources[i]
+            start += len(sources[i])
+
+    text = text.T.ravel()
+    return text[text != 0].tobytes().decode("ascii")
+
+def iter_materials(materials):
+    """
+    Yields the Materials section in chunks of at most CHUNK_SIZE materials
+
+    Materials should be a list of Material records where list index = material index
+    """
+    number_materials = len(materials)
+    yield write_indented(write_labeled_int("NumMaterials", number_materials), 1)
+
+    logger.debug("Writing %d materials", number_materials)
+
+    for start in range(0, number_materials, CHUNK_SIZE):
+        yield "".join(format_material(material) for material in materials[start:start + CHUNK_SIZE])
+
+def iter_points(points):
+    """
+    Yields the Points section in chunks of at most CHUNK_SIZE points
+
+    Points should be a list of Point records
+
+    [Point(Name, Position [x, y, z], Orientation [[x, y, z], [x, y, z], [x, y, z]])]
+    """
+    number_points = len(points)
+    yield write_indented(write_labeled_int("NumPoints", number_points), 1)
+
+    logger.debug("Writing %d points", number_points)
+
+    for start in range(0, number_points, CHUNK_SIZE):
+        yield "".join(format_point(point) for point in points[start:start + CHUNK_SIZE])
+
+def iter_vertices(positions, normals, tangents, colors, uv0, uv1):
+    """
+    Yields the Vertices section in chunks of at most CHUNK_SIZE vertices
+
+    Vertex attributes should be arrays with one row per vertex
+
+    positions, normals, tangents (n, 3), colors (n), uv0, uv1 (n, 2)
+    """
+    number_verts = len(positions)
+    yield write_indented(write_labeled_int("NumVertices", number_verts), 1)
+
+    logger.debug("Writing %d vertices", number_verts)
+
+    for start in range(0, number_verts, CHUNK_SIZE):
+        end = start + CHUNK_SIZE
+        yield format_rows(VERTEX_TEMPLATE, (positions[start:end],
+                                            normals[start:end],
+                                            tangents[start:end],
+                                            colors[start:end],
+                                            uv0[start:end],
+                                            uv1[start:end]))
+
+def iter_triangles(triangles, material_ids):
+    """
+    Yields the Triangles section in chunks of at most CHUNK_SIZE triangles
+
+    Triangles should be an (n, 3) array of vertex indices with a matching
+    array of material indices
+    """
+    number_tris = len(triangles)
+    yield write_indented(write_labeled_int("NumTriangles", number_tris), 1)
+
+    logger.debug("Writing %d triangles", number_tris)
+
+    for start in range(0, number_tris, CHUNK_SIZE):
+        end = start + CHUNK_SIZE
+        yield format_rows(TRIANGLE_TEMPLATE, (triangles[start:end], material_ids[start:end]))
+
+def write_materials(materials):
+    """
+    Writes Materials to string
+    """
+    return "".join(iter_materials(materials))
+
+def write_points(points):
+    """
+    Writes Points to string
+    """
+    return "".join(iter_points(points))
+
+def write_vertices(positions, normals, tangents, colors, uv0, uv1):
+    """
+    Writes verts to string
+    """
+    return "".join(iter_vertices(positions, normals, tangents, colors, uv0, uv1))
+
+def write_triangles(triangles, material_ids):
+    """
+    Writes faces to string
+    """
+    return "".join(iter_triangles(triangles, material_ids))
+
+def write_cached_indices(cached_indices):
+    """
+    Writes the per direction cached vertex indices to string
+    
+    cached_indices should map each CACHED_DIRECTIONS name to an index array
+    """
+    output = ""
+    for direction in CACHED_DIRECTIONS:
+        indices = cached_indices.get(direction, ())
+        label = "NumCachedVertexIndicesInDirection:" + direction
+        output += write_indented(write_labeled_int(label, len(indices)), 1)
+        if len(indices):
+            output += format_rows(CACHED_INDEX_TEMPLATE, (np.asarray(indices),))
+    return output
+
+def count_chunks(count):
+    """
+    Returns how many chunks a section of count blocks is yielded in, including its count line
+    """
+    return 1 + -(-count // CHUNK_SIZE)
+
+def iter_text_sections(mesh):
+    """
+    Yields (name, number of chunks, source values, chunks) for each part of a text .mesh file
+
+    Source values are everything the section's text depends on, or None for
+    the header and cached indices which are cheap enough to always format.
+    The chunks are generators, nothing is formatted until they are consumed.
+    """
+    yield "header", 2, None, iter(["TXT\nMeshData\n", write_header(mesh)])
+
+    #Important stuff; materials, bones, verts, faces
+    yield ("materials", count_chunks(len(mesh.materials)),
+            (mesh.materials,),
+            iter_materials(mesh.materials))
+    yield ("points", count_chunks(len(mesh.points)),
+            (mesh.points,),
+            iter_points(mesh.points))
+    yield ("vertices", count_chunks(mesh.num_vertices),
+            (mesh.positions, mesh.normals, mesh.tangents, mesh.colors, mesh.uv0, mesh.uv1),
+            iter_vertices(mesh.positions, mesh.normals, mesh.tangents, mesh.colors, mesh.uv0, mesh.uv1))
+    yield ("triangles", count_chunks(mesh.num_triangles),
+            (mesh.triangles, mesh.material_ids),
+            iter_triangles(mesh.triangles, mesh.material_ids))
+
+    yield "cached_indices", 1, None, iter([write_cached_indices(mesh.cached_indices)])
+
+def iter_mesh_text(mesh):
+    """
+    Yields a whole text .mesh file as a sequence of bounded size chunks
+    """
+    for name, number_chunks, values, chunks in iter_text_sections(mesh):
+        yield from chunks
+
+def count_text_chunks(mesh):
+    """
+    Returns how many chunks iter_mesh_text yields for mesh
+    """
+    return sum(number_chunks for name, number_chunks, values, chunks in iter_text_sections(mesh))
+
+def write_mesh_text(filepath, mesh, timings=NO_TIMINGS, progress=None, sections=None):
+    """
+    Writes MeshData to a text .mesh file
+
+    Sections are streamed to a buffered file chunk by chunk, so peak memory does
+    not grow with the number of vertices. Formatting is timed as the "serialise"
+    stage and file output as "write". progress, if given, is called with the
+    fraction written after every chunk and may raise to stop the write.
+
+    sections is an optional TargetSections from mesh_cache. Sections whose
+    values, TEXT_FORMAT_VERSION and CHUNK_SIZE match it are copied from its
+    cached text instead of being formatted, the others are also written to it
+    for next time.
+    """
+    total = count_text_chunks(mesh)
+    written = 0
+
+    with open(filepath, 'w', encoding='utf-8', buffering=WRITE_BUFFER_SIZE) as f:
+        for name, number_chunks, values, chunks in iter_text_sections(mesh):
+            cached_path = None
+            if sections is not None and values is not None:
+                with timings.stage("hash"):
+                    cached_path = sections.lookup(name, [TEXT_FORMAT_VERSION, CHUNK_SIZE, *values])
+
+            if cached_path is not None:
+                with timings.stage("write"):
+                    with open(cached_path, 'r', encoding='utf-8') as cached:
+                        shutil.copyfileobj(cached, f, WRITE_BUFFER_SIZE)
+                timings.count("reused_sections", 1)
+                written += number_chunks
+                if progress is not None:
+                    progress(written / total)
+                continue
+
+            copy = None
+            if sections is not None and values is not None:
+                copy = sections.open_pending(name)
+            try:
+                while True:
+                    with timings.stage("serialise"):
+                        chunk = next(chunks, None)
+                    if chunk is None:
+                        break
+                    with timings.stage("write"):
+                        f.write(chunk)
+                        if copy is not None:
+                            copy.write(chunk)
+                    written += 1
+                    if progress is not None:
+                        progress(written / total)
+            finally:
+                if copy is not None:
+                    copy.close()
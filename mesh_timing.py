@@ -0,0 +1,96 @@
+import contextlib
+import json
+import logging
+import os
+import time
+
+#Per stage timing and counters for imports and exports, no bpy required
+#
+#Reports go to the "soase_mesh" logger at INFO level, enable them with for example
+#
+#   logging.basicConfig()
+#   logging.getLogger("soase_mesh").setLevel(logging.INFO)
+#
+#Setting SOASE_MESH_TIMING_REPORT to a file path also appends every report to
+#that file as one JSON object per line. With neither, timing costs nothing.
+
+logger = logging.getLogger("soase_mesh")
+
+class Timings:
+    """
+    Wall time per named stage and item counters for one import or export
+
+    Stages entered several times add up, so a stage can wrap every chunk of a
+    streamed write.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.enabled = True
+        self.stages = {}
+        self.counters = {}
+        self.start = time.perf_counter()
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds, calls = self.stages.get(name, (0.0, 0))
+            self.stages[name] = (seconds + time.perf_counter() - start, calls + 1)
+
+    def count(self, name, value):
+        self.counters[name] = self.counters.get(name, 0) + value
+
+    def report(self):
+        return {
+            "name": self.name,
+            "seconds": time.perf_counter() - self.start,
+            "stages": {name: {"seconds": seconds, "calls": calls} for name, (seconds, calls) in self.stages.items()},
+            "counters": dict(self.counters),
+        }
+
+    def finish(self):
+        """
+        Logs the report and appends it to the SOASE_MESH_TIMING_REPORT file if set
+        """
+        report = self.report()
+        logger.info("%s took %.3f s", self.name, report["seconds"])
+        for name, (seconds, calls) in self.stages.items():
+            logger.info("  %-10s %8.3f s  %d calls", name, seconds, calls)
+        for name, value in self.counters.items():
+            logger.info("  %-10s %d", name, value)
+
+        filepath = os.environ.get("SOASE_MESH_TIMING_REPORT")
+        if filepath:
+            with open(filepath, 'a') as f:
+                f.write(json.dumps(report) + "\n")
+        return report
+
+class DisabledTimings:
+    """
+    Stand in for Timings that records nothing
+    """
+
+    enabled = False
+    _null_stage = contextlib.nullcontext()
+
+    def stage(self, name):
+        return self._null_stage
+
+    def count(self, name, value):
+        pass
+
+    def finish(self):
+        return None
+
+NO_TIMINGS = DisabledTimings()
+
+def get_timings(name):
+    """
+    Returns a Timings named name when reports are enabled, otherwise NO_TIMINGS
+    """
+    if logger.isEnabledFor(logging.INFO) or os.environ.get("SOASE_MESH_TIMING_REPORT"):
+        return Timings(name)
+    return NO_TIMINGS
@@ -0,0 +1,64 @@
+import os
+
+from mesh_cache import hash_values
+
+#Change detection for hot reloading watched .mesh files, no bpy required
+#
+#Files are polled by size and modification time. A changed file is parsed
+#again and each section hashed, so only the sections that really changed have
+#to be written back into Blender.
+
+MESH_SECTIONS = ("positions", "normals", "tangents", "colors", "uv0", "triangles", "material_ids", "materials", "points")
+
+def get_stamp(filepath):
+    """
+    Returns (size, modification time in ns) of a file, or None if it cannot be read
+    """
+    try:
+        stat = os.stat(filepath)
+    except OSError:
+        return None
+    return stat.st_size, stat.st_mtime_ns
+
+def hash_sections(mesh):
+    """
+    Returns a digest per section of a MeshData
+    """
+    return {name: hash_values([getattr(mesh, name)]) for name in MESH_SECTIONS}
+
+class WatchedFile:
+    """
+    An imported .mesh file polled for changes, with the section digests of its last load
+
+    The stamp is taken when the file is added, before it is read, so a change
+    made while it loads is still picked up. object_name and skeleton_name are
+    the objects the file was loaded into.
+    """
+
+    def __init__(self, filepath, object_name=None, skeleton_name=None):
+        self.filepath = filepath
+        self.object_name = object_name
+        self.skeleton_name = skeleton_name
+        self.stamp = get_stamp(filepath)
+        self.hashes = {}
+        self.point_names = ()
+
+    def poll(self):
+        """
+        Returns True once each time the file's size or modification time changes
+        """
+        stamp = get_stamp(self.filepath)
+        if stamp is None or stamp == self.stamp:
+            return False
+        self.stamp = stamp
+        return True
+
+    def update(self, mesh):
+        """
+        Stores the section digests of a newly read MeshData and returns the names of the sections that changed
+        """
+        hashes = hash_sections(mesh)
+        changed = {name for name, digest in hashes.items() if self.hashes.get(name) != digest}
+        self.hashes = hashes
+        self.point_names = tuple(point.name for point in mesh.points)
+        return changed
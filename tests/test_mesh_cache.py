@@ -0,0 +1,84 @@
+import os
+
+import numpy as np
+
+from mesh_benchmark import make_synthetic_mesh
+import mesh_cache
+from mesh_cache import ParseCache, SectionCache
+from mesh_data import Point
+from mesh_io import read_mesh_file, write_mesh_file
+
+def get_size(directory):
+    return sum(os.path.getsize(os.path.join(root, name)) for root, dirs, names in os.walk(directory) for name in names)
+
+def test_parse_cache_misses_after_mtime_change(tmp_path):
+    filepath = str(tmp_path / "ship.mesh")
+    write_mesh_file(filepath, make_synthetic_mesh(300))
+    cache = ParseCache(str(tmp_path / "parsed"))
+    assert cache.load(filepath) is None
+
+    mesh = read_mesh_file(filepath, cache)
+    cached = cache.load(filepath)
+    assert cached is not None
+    for name in ("positions", "normals", "tangents", "colors", "uv0", "uv1", "triangles", "material_ids"):
+        assert np.array_equal(getattr(cached, name), getattr(mesh, name))
+    assert cached.materials == mesh.materials
+    assert cached.points == mesh.points
+
+    #Same contents, but touched since it was cached
+    stat = os.stat(filepath)
+    os.utime(filepath, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+    assert cache.load(filepath) is None
+    read_mesh_file(filepath, cache)
+    assert cache.load(filepath) is not None
+
+def read_bytes(path):
+    with open(str(path), 'rb') as f:
+        return f.read()
+
+def test_section_cache_matches_fresh_write(tmp_path, monkeypatch):
+    mesh = make_synthetic_mesh(400)
+    filepath = str(tmp_path / "ship.mesh")
+    cache = SectionCache(str(tmp_path / "sections"))
+    write_mesh_file(filepath, mesh, section_cache=cache)
+
+    hits = {}
+    lookup = mesh_cache.TargetSections.lookup
+    def record_lookup(self, name, values):
+        path = lookup(self, name, values)
+        hits[name] = path is not None
+        return path
+    monkeypatch.setattr(mesh_cache.TargetSections, "lookup", record_lookup)
+
+    #Only the points section changes, the rest is spliced from the cache
+    point = mesh.points[0]
+    mesh.points[0] = Point(point.name, (point.position[0] + 1.5, point.position[1], point.position[2]), point.orientation)
+    write_mesh_file(filepath, mesh, section_cache=cache)
+    assert hits == {"materials": True, "points": False, "vertices": True, "triangles": True}
+
+    write_mesh_file(str(tmp_path / "fresh.mesh"), mesh)
+    assert read_bytes(filepath) == read_bytes(tmp_path / "fresh.mesh")
+    assert read_mesh_file(filepath).points[0].position[0] == np.float32(point.position[0] + 1.5)
+
+def test_section_cache_evicts_oldest_targets(tmp_path):
+    mesh = make_synthetic_mesh(400)
+    directory = str(tmp_path / "sections")
+    first = SectionCache(directory)
+    write_mesh_file(str(tmp_path / "first.mesh"), mesh, section_cache=first)
+    size = get_size(directory)
+
+    #Exported in order, long ago so every new export is the most recent
+    def age(cache, filepath, seconds):
+        os.utime(os.path.join(cache.get_target(filepath).directory, "hashes.json"), (seconds, seconds))
+    age(first, str(tmp_path / "first.mesh"), 1e9)
+
+    cache = SectionCache(directory, max_size=int(size * 2.5))
+    names = ["a", "b", "c", "d"]
+    for i, name in enumerate(names):
+        filepath = str(tmp_path / (name + ".mesh"))
+        write_mesh_file(filepath, mesh, section_cache=cache)
+        age(cache, filepath, 1e9 + i + 1)
+
+    kept = [os.path.isdir(cache.get_target(str(tmp_path / (name + ".mesh"))).directory) for name in names]
+    assert kept == [False, False, True, True]
+    assert get_size(directory) <= size * 2.5
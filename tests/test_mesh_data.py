@@ -0,0 +1,147 @@
+import numpy as np
+import pytest
+
+import mesh_data
+from mesh_data import MeshData, transform_mesh, weld_positions, weld_vertices
+
+def reference_weld(positions, tolerance):
+    """
+    Greedy remove doubles by brute force: each vertex merges into the first kept vertex within tolerance
+    """
+    target = np.arange(len(positions))
+    kept = np.zeros(len(positions), dtype=bool)
+    for j in range(len(positions)):
+        for i in range(j):
+            if kept[i] and np.sum((positions[i] - positions[j]) ** 2) <= tolerance * tolerance:
+                target[j] = i
+                break
+        else:
+            kept[j] = True
+    return target
+
+def make_corner_mesh(positions, **attributes):
+    count = len(positions)
+    values = dict(normals=np.tile([0, 0, 1], (count, 1)),
+                    tangents=np.tile([1, 0, 0], (count, 1)),
+                    colors=np.zeros(count),
+                    uv0=np.zeros((count, 2)),
+                    triangles=np.arange(count - count % 3).reshape(-1, 3),
+                    material_ids=np.zeros(count // 3))
+    values.update(attributes)
+    return MeshData(positions=positions, **values)
+
+def test_weld_positions_across_cells():
+    #Closer than the tolerance but either side of a multiple of it
+    keep, remap = weld_positions([[0.0000999, 0, 0], [0.0001005, 0, 0]], 0.0001)
+    assert list(keep) == [0]
+    assert list(remap) == [0, 0]
+
+def test_weld_positions_does_not_chain():
+    positions = np.zeros((10, 3))
+    positions[:, 0] = np.arange(10) * 0.00009
+    keep, remap = weld_positions(positions, 0.0001)
+    assert np.all(np.linalg.norm(positions - positions[keep][remap], axis=1) <= 0.0001)
+    assert list(keep) == [0, 2, 4, 6, 8]
+
+def test_weld_positions_uses_distance():
+    #Within the tolerance on every axis but not in distance
+    keep, _ = weld_positions([[0, 0, 0], [0.00008, 0.00008, 0.00008]], 0.0001)
+    assert list(keep) == [0, 1]
+
+@pytest.mark.parametrize("seed", range(20))
+def test_weld_positions_matches_reference(seed):
+    rng = np.random.default_rng(seed)
+    count = rng.integers(1, 80)
+    positions = rng.integers(-4, 4, (count, 3)) * 0.6e-4 + rng.normal(0, 2e-5, (count, 3))
+    keep, remap = weld_positions(positions, 0.0001)
+    assert np.array_equal(keep[remap], reference_weld(positions, 0.0001))
+
+@pytest.mark.parametrize("seed", range(10))
+def test_weld_positions_with_copies_matches_reference(seed, monkeypatch):
+    #Small chunks so pairs of one cell are split across them
+    monkeypatch.setattr(mesh_data, "PAIR_CHUNK_SIZE", 7)
+    rng = np.random.default_rng(seed)
+    count = rng.integers(1, 60)
+    positions = rng.integers(-3, 3, (count, 3)) * 0.6e-4 + rng.normal(0, 2e-5, (count, 3))
+    positions[rng.random(count) < 0.4] = positions[0]
+    positions[rng.random(count) < 0.1] = 0.0
+    positions[rng.random(count) < 0.1] = -0.0
+    keep, remap = weld_positions(positions, 0.0001)
+    assert np.array_equal(keep[remap], reference_weld(positions, 0.0001))
+
+def test_weld_positions_coincident():
+    keep, remap = weld_positions(np.ones((20000, 3)), 0.0001)
+    assert list(keep) == [0]
+    assert not remap.any()
+
+def test_weld_positions_crowded_cell(monkeypatch):
+    #Past MAX_CELL_PAIRS some close vertices may be missed, but merges stay within tolerance
+    monkeypatch.setattr(mesh_data, "MAX_CELL_PAIRS", 3)
+    rng = np.random.default_rng(0)
+    positions = 1 + rng.uniform(-0.00004, 0.00004, (500, 3))
+    keep, remap = weld_positions(positions, 0.0001)
+    assert np.all(np.linalg.norm(positions - positions[keep][remap], axis=1) <= 0.0001)
+    assert np.array_equal(remap[keep], np.arange(len(keep)))
+    assert len(keep) < 10
+
+def test_weld_positions_without_tolerance():
+    keep, remap = weld_positions([[0, 0, 0], [0, 0, 0]], 0)
+    assert list(keep) == [0, 1]
+    assert list(remap) == [0, 1]
+
+def test_weld_vertices_tolerance():
+    positions = np.array([[1, 2, 3], [1, 2, 3], [1, 2, 3]], dtype=np.float64)
+    positions[1, 0] += 0.9e-6
+    positions[2, 0] += 2.5e-6
+    mesh = weld_vertices(make_corner_mesh(positions), 1e-6)
+    assert mesh.num_vertices == 2
+    assert list(mesh.triangles[0]) == [0, 0, 1]
+
+def test_weld_vertices_tolerance_covers_every_attribute():
+    positions = np.zeros((3, 3))
+    uv0 = np.array([[0.5, 0.5], [0.5, 0.5], [0.5, 0.5 + 1e-3]])
+    colors = np.array([1, 2, 1])
+    mesh = weld_vertices(make_corner_mesh(positions, uv0=uv0, colors=colors), 1e-6)
+    assert mesh.num_vertices == 3
+
+def test_weld_vertices_exact():
+    positions = np.array([[0, 0, 0], [0, 0, 0], [1, 0, 0], [0, 0, 0], [1, 0, 0], [0, 1, 0]])
+    mesh = weld_vertices(make_corner_mesh(positions), 0)
+    assert mesh.num_vertices == 3
+    assert mesh.triangles.tolist() == [[0, 0, 1], [0, 1, 2]]
+
+@pytest.mark.parametrize("tolerance", [0, 1e-6])
+def test_weld_vertices_keeps_cached_order(tolerance):
+    positions = np.array([[0, 0, 0], [2, 0, 0], [0, 0, 0], [1, 0, 0], [2, 0, 0], [0, 1, 0]])
+    mesh = make_corner_mesh(positions, cached_indices={"RIGHT": [4, 1, 3, 2]})
+    mesh = weld_vertices(mesh, tolerance)
+    assert list(mesh.cached_indices["RIGHT"]) == [1, 2, 0]
+
+def test_select_vertices_drops_cached():
+    mesh = make_corner_mesh(np.arange(18).reshape(6, 3), cached_indices={"UP": [5, 0, 3, 1]})
+    keep = np.array([3, 0, 1])
+    remap = np.array([1, 2, -1, 0, -1, -1], dtype=np.int32)
+    mesh.select_vertices(keep, remap)
+    assert mesh.positions.tolist() == [[9, 10, 11], [0, 1, 2], [3, 4, 5]]
+    assert mesh.triangles.tolist() == [[1, 2, -1], [0, -1, -1]]
+    assert list(mesh.cached_indices["UP"]) == [1, 0, 2]
+
+def test_transform_mesh_mirror_reverses_winding():
+    mesh = make_corner_mesh(np.array([[0, 0, 0], [1, 0, 0], [0, 1, 0]]))
+    transform_mesh(mesh, np.diag([-1, 1, 1, 1]))
+
+    corners = mesh.positions[mesh.triangles[0]]
+    mirrored_normal = np.cross(corners[1] - corners[0], corners[2] - corners[0])
+    assert mesh.triangles.tolist() == [[0, 2, 1]]
+    assert np.dot(mirrored_normal, mesh.normals[0]) > 0
+
+def test_transform_mesh_keeps_winding():
+    mesh = make_corner_mesh(np.array([[0, 0, 0], [1, 0, 0], [0, 1, 0]]))
+    transform_mesh(mesh, np.diag([2, 2, 2, 1]))
+    assert mesh.triangles.tolist() == [[0, 1, 2]]
+
+def test_uv1_copies_uv0():
+    mesh = make_corner_mesh(np.zeros((3, 3)))
+    assert np.array_equal(mesh.uv1, mesh.uv0)
+    mesh.uv0[:, 1] = 1 - mesh.uv0[:, 1]
+    assert np.all(mesh.uv1 == 0)
@@ -0,0 +1,26 @@
+import pytest
+
+from mesh_benchmark import make_synthetic_mesh
+from mesh_io import detect_format, read_mesh_file, write_mesh_file
+
+def read_bytes(path):
+    with open(str(path), 'rb') as f:
+        return f.read()
+
+def test_text_binary_text_round_trip(tmp_path):
+    write_mesh_file(str(tmp_path / "source.mesh"), make_synthetic_mesh(500))
+    mesh = read_mesh_file(str(tmp_path / "source.mesh"))
+    write_mesh_file(str(tmp_path / "copy.meshbin"), mesh, "BIN")
+    assert detect_format(str(tmp_path / "copy.meshbin")) == "BIN"
+
+    mesh = read_mesh_file(str(tmp_path / "copy.meshbin"))
+    write_mesh_file(str(tmp_path / "copy.mesh"), mesh)
+    assert read_bytes(tmp_path / "copy.mesh") == read_bytes(tmp_path / "source.mesh")
+
+@pytest.mark.parametrize("start", [b"BIN\x01\x00\x00\x00", b"\x93\x8a\xff\x10\x00"])
+def test_game_binary_rejected(tmp_path, start):
+    path = str(tmp_path / "game.mesh")
+    with open(path, 'wb') as f:
+        f.write(start + bytes(64))
+    with pytest.raises(ValueError, match="not supported"):
+        read_mesh_file(path)
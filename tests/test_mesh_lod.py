@@ -0,0 +1,61 @@
+import numpy as np
+import pytest
+
+from mesh_benchmark import make_synthetic_mesh
+from mesh_lod import (MIN_NORMAL_COS, decimate_mesh, decimate_triangles, find_locked_vertices, generate_lods,
+                        get_face_normals)
+
+SIDE = 40
+
+@pytest.fixture
+def grid():
+    #A wavy grid facing up, split into two materials halfway along
+    mesh = make_synthetic_mesh(SIDE * SIDE)
+    mesh.material_ids = (mesh.triangles[:, 0] // SIDE >= SIDE // 2).astype(np.int32)
+    return mesh
+
+def test_locked_vertices(grid):
+    locked = find_locked_vertices(grid).reshape(SIDE, SIDE)
+    assert locked[0].all() and locked[-1].all() and locked[:, 0].all() and locked[:, -1].all()
+    assert locked[SIDE // 2].all()
+    assert locked[1:-1, 1:-1].sum() == SIDE - 2
+
+def test_decimate_reaches_target(grid):
+    lod = decimate_mesh(grid, grid.num_triangles // 4)
+    assert lod.num_triangles <= grid.num_triangles // 4
+    assert lod.triangles.min() >= 0 and lod.triangles.max() < lod.num_vertices
+    assert len(lod.material_ids) == lod.num_triangles
+
+def test_decimate_keeps_locked_vertices(grid):
+    lod = decimate_mesh(grid, grid.num_triangles // 4)
+    locked = grid.positions[find_locked_vertices(grid)]
+    kept = {tuple(position) for position in lod.positions.tolist()}
+    assert all(tuple(position) in kept for position in locked.tolist())
+
+    #Every triangle stays on its side of the material boundary
+    middle = grid.positions[SIDE * (SIDE // 2), 2]
+    sides = lod.positions[lod.triangles][:, :, 2]
+    assert np.all(sides[lod.material_ids == 0] <= middle)
+    assert np.all(sides[lod.material_ids == 1] >= middle)
+
+@pytest.mark.parametrize("ratio", [2, 4, 8, 16, 32])
+def test_decimate_does_not_flip(grid, ratio):
+    #Compared with the triangle each one started as, so turns cannot add up over passes
+    positions = grid.positions.astype(np.float64)
+    triangles, alive = decimate_triangles(positions, grid.triangles.astype(np.int64),
+                                            find_locked_vertices(grid), grid.num_triangles // ratio)
+    normals = get_face_normals(positions, triangles)
+    original = get_face_normals(positions, grid.triangles[alive])
+    lengths = np.linalg.norm(normals, axis=1) * np.linalg.norm(original, axis=1)
+    assert np.all(np.einsum("ij,ij->i", normals, original) > MIN_NORMAL_COS * lengths)
+
+def test_decimate_moves_no_vertices(grid):
+    lod = decimate_mesh(grid, grid.num_triangles // 4)
+    original = {tuple(position) for position in grid.positions.tolist()}
+    assert all(tuple(position) in original for position in lod.positions.tolist())
+
+def test_generate_lods(grid):
+    counts = [lod.num_triangles for lod in generate_lods(grid)]
+    assert counts == sorted(counts, reverse=True)
+    assert counts[0] <= grid.num_triangles // 2
+    assert counts[-1] < counts[0]
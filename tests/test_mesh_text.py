@@ -0,0 +1,170 @@
+import numpy as np
+import pytest
+
+import mesh_data
+from mesh_benchmark import make_synthetic_mesh
+from mesh_text import (MAX_BULK_FLOAT, format_rows, read_mesh_text, scan_mesh_text, write_cached_indices,
+                        write_indented, write_labeled_3list, write_labeled_float, write_labeled_int,
+                        write_mesh_text, write_triangles, write_vertices)
+
+#The bulk formatters must give exactly the text of the per value helpers,
+#which are what the game's files were originally written with.
+
+def reference_vertices(positions, normals, tangents, colors, uv0, uv1):
+    text = write_indented(write_labeled_int("NumVertices", len(positions)), 1)
+    for i in range(len(positions)):
+        text += write_indented("Vertex", 1)
+        text += write_indented(write_labeled_3list("Position", positions[i]), 2)
+        text += write_indented(write_labeled_3list("Normal", normals[i]), 2)
+        text += write_indented(write_labeled_3list("Tangent", tangents[i]), 2)
+        text += write_indented(write_labeled_int("Color", colors[i]), 2)
+        text += write_indented(write_labeled_float("U0", uv0[i][0]), 2)
+        text += write_indented(write_labeled_float("V0", uv0[i][1]), 2)
+        text += write_indented(write_labeled_float("U1", uv1[i][0]), 2)
+        text += write_indented(write_labeled_float("V1", uv1[i][1]), 2)
+    return text
+
+def reference_triangles(triangles, material_ids):
+    text = write_indented(write_labeled_int("NumTriangles", len(triangles)), 1)
+    for triangle, material_id in zip(triangles, material_ids):
+        text += write_indented("Triangle", 1)
+        for i in range(3):
+            text += write_indented(write_labeled_int("iVertex{}".format(i), triangle[i]), 2)
+        text += write_indented(write_labeled_int("iMaterial", material_id), 2)
+    return text
+
+def reference_floats(values):
+    return "".join("{:.6f}\n".format(value) for value in values.tolist())
+
+def assert_same_text(text, expected):
+    #Comparing megabytes of text directly makes pytest build a huge diff, so point at the first bad line
+    if text != expected:
+        lines = text.splitlines(True)
+        expected_lines = expected.splitlines(True)
+        line = next((i for i, pair in enumerate(zip(lines, expected_lines)) if pair[0] != pair[1]),
+                    min(len(lines), len(expected_lines)))
+        assert lines[line:line + 1] == expected_lines[line:line + 1], "line {}".format(line + 1)
+
+def mesh_columns(mesh):
+    return mesh.positions, mesh.normals, mesh.tangents, mesh.colors, mesh.uv0, mesh.uv1
+
+def random_columns(rng, count, scale):
+    positions = (rng.normal(size=(count, 3)) * scale).astype(np.float32)
+    normals = rng.normal(size=(count, 3)).astype(np.float32)
+    tangents = (rng.normal(size=(count, 3)) * 1e-7).astype(np.float32)
+    colors = rng.integers(0, 1 << 32, count, dtype=np.uint32)
+    uv0 = rng.random((count, 2)).astype(np.float32)
+    uv1 = (rng.random((count, 2)) * -3).astype(np.float32)
+    return positions, normals, tangents, colors, uv0, uv1
+
+def test_test_mesh_matches_reference():
+    columns = mesh_columns(mesh_data.test_mesh)
+    assert_same_text(write_vertices(*columns), reference_vertices(*columns))
+    mesh = mesh_data.test_mesh
+    assert_same_text(write_triangles(mesh.triangles, mesh.material_ids), reference_triangles(mesh.triangles, mesh.material_ids))
+
+def test_test_mesh_round_trip(tmp_path):
+    filepath = str(tmp_path / "test.mesh")
+    write_mesh_text(filepath, mesh_data.test_mesh)
+    mesh = read_mesh_text(filepath)
+    for name in ("positions", "normals", "tangents", "colors", "uv0", "uv1", "triangles", "material_ids"):
+        values = getattr(mesh_data.test_mesh, name)
+        expected = np.array([float("{:.6f}".format(value)) for value in values.ravel().tolist()]).reshape(values.shape)
+        assert np.array_equal(getattr(mesh, name), expected.astype(values.dtype)), name
+    assert [point.name for point in mesh.points] == ["Test"]
+
+    #Writing what was read gives the same file again
+    second = str(tmp_path / "second.mesh")
+    write_mesh_text(second, mesh)
+    with open(filepath, "rb") as f, open(second, "rb") as g:
+        assert f.read() == g.read()
+
+@pytest.mark.parametrize("indent", ["    ", " "])
+def test_read_any_indentation(tmp_path, indent):
+    filepath = str(tmp_path / "tabs.mesh")
+    write_mesh_text(filepath, make_synthetic_mesh(100))
+    with open(filepath) as f:
+        text = f.read()
+    spaced = str(tmp_path / "spaces.mesh")
+    with open(spaced, "w") as f:
+        f.write(text.replace("\t", indent))
+
+    mesh = read_mesh_text(filepath)
+    other = read_mesh_text(spaced)
+    for name in ("positions", "normals", "tangents", "colors", "uv0", "uv1", "triangles", "material_ids"):
+        assert np.array_equal(getattr(other, name), getattr(mesh, name)), name
+    assert other.materials == mesh.materials
+    assert other.points == mesh.points
+    assert scan_mesh_text(spaced).declared_counts == scan_mesh_text(filepath).declared_counts
+
+@pytest.mark.parametrize("exponent", range(-8, 12))
+def test_random_vertices_match_reference(exponent):
+    rng = np.random.default_rng(exponent + 8)
+    columns = random_columns(rng, 300, 10.0 ** exponent)
+    assert_same_text(write_vertices(*columns), reference_vertices(*columns))
+
+def test_signed_zeros_match_reference():
+    values = np.array([0.0, -0.0, 5e-7, -5e-7, 4e-7, -4e-7, 6e-7, -6e-7, 1e-45, -1e-45], dtype=np.float32)
+    assert_same_text(format_rows("%.6f\n", (values,)), reference_floats(values))
+    assert_same_text(format_rows("%.6f\n", (-values,)), reference_floats(-values))
+
+def test_rounding_ties_match_reference():
+    #Odd multiples of 1/128 are exact in float32 and end in exactly half a
+    #millionth, so every one of them is a rounding tie
+    rng = np.random.default_rng(0)
+    odd = np.concatenate([np.arange(1, 1 << 16, 2), rng.integers(0, 1 << 23, 100000) * 2 + 1])
+    values = (odd / 128).astype(np.float32)
+    assert np.all(values.astype(np.float64) * 1e6 % 1 == 0.5)
+    values = np.concatenate([values, -values])
+    assert_same_text(format_rows("%.6f\n", (values,)), reference_floats(values))
+
+def test_digit_count_boundaries_match_reference():
+    #Around 1000, where the scaled values stop fitting the int32 fast path,
+    #and around every other power of ten, past MAX_BULK_FLOAT
+    bases = np.array([10.0 ** exponent for exponent in range(-6, 20)], dtype=np.float32)
+    values = np.concatenate([bases, np.nextafter(bases, np.float32(0)), np.nextafter(bases, np.float32(np.inf)),
+                            np.float32(999.9999995) + np.arange(-8, 8, dtype=np.float32) * np.float32(6.1e-5)])
+    values = np.concatenate([values, -values])
+    assert_same_text(format_rows("%.6f\n", (values,)), reference_floats(values))
+
+    #The same values mixed into single rows, so narrow and wide fields share a batch
+    columns = (values[:, None].repeat(3, axis=1),)
+    assert_same_text(format_rows("%.6f %.6f %.6f\n", columns),
+                        "".join("{0:.6f} {0:.6f} {0:.6f}\n".format(value) for value in values.tolist()))
+
+@pytest.mark.parametrize("values", [
+    np.array([MAX_BULK_FLOAT, 1.0], dtype=np.float32),
+    np.array([-3.4e38, 0.5], dtype=np.float32),
+    np.array([np.inf, -np.inf, np.nan, 1.0], dtype=np.float32),
+    np.array([0.1234565, 1.0000005, 2.5e-7], dtype=np.float64),
+])
+def test_fallback_matches_reference(values):
+    assert_same_text(format_rows("%.6f\n", (values,)), reference_floats(values))
+
+def test_triangles_match_reference():
+    rng = np.random.default_rng(1)
+    triangles = rng.integers(-5, np.iinfo(np.int32).max, (300, 3)).astype(np.int32)
+    triangles[0] = [np.iinfo(np.int32).min, -1, 0]
+    material_ids = rng.integers(0, 5, 300).astype(np.int32)
+    assert_same_text(write_triangles(triangles, material_ids), reference_triangles(triangles, material_ids))
+
+def test_colors_match_reference():
+    columns = list(random_columns(np.random.default_rng(2), 4, 1.0))
+    columns[3] = np.array([0, 9, 10, (1 << 32) - 1], dtype=np.uint32)
+    assert_same_text(write_vertices(*columns), reference_vertices(*columns))
+
+def test_cached_indices_match_reference():
+    cached_indices = {"UP": np.array([3, 0, 12345678, 9], dtype=np.int32), "BACK": np.array([7], dtype=np.int32)}
+    expected = ""
+    for direction in mesh_data.CACHED_DIRECTIONS:
+        indices = cached_indices.get(direction, ())
+        expected += write_indented(write_labeled_int("NumCachedVertexIndicesInDirection:" + direction, len(indices)), 1)
+        expected += "".join(write_indented(write_labeled_int("CachedVertexIndex", index), 1) for index in indices)
+    assert_same_text(write_cached_indices(cached_indices), expected)
+
+def test_empty_sections_match_reference():
+    columns = random_columns(np.random.default_rng(3), 0, 1.0)
+    assert_same_text(write_vertices(*columns), reference_vertices(*columns))
+    triangles = np.zeros((0, 3), dtype=np.int32)
+    material_ids = np.zeros(0, dtype=np.int32)
+    assert_same_text(write_triangles(triangles, material_ids), reference_triangles(triangles, material_ids))